@@ -1,33 +1,269 @@
 from langgraph.graph import MessagesState, StateGraph
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import math
 import os
+import re
+import time
 from dotenv import load_dotenv
+from cache import TTLCache
+from pipeline import MicroBatcher
+from models.schemas import Decision, TradeDecision
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model='gemini-2.0-flash', api_key=os.getenv('GEMINI_API_KEY'))
+MODEL_NAME = 'gemini-2.0-flash'
+
+llm = ChatGoogleGenerativeAI(model=MODEL_NAME, api_key=os.getenv('GEMINI_API_KEY'))
 
 class State(MessagesState):
     pass
 
+# Async analysis limits
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 16))  # concurrent LLM calls
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", 30))         # seconds per analysis
+
+system_msg = {
+    "role": "system",
+    "content": (
+        "You are a trade analyzing assistant. "
+        "Given the trade information, your task is to decide whether the trade is worth copying or not. "
+        "Start your reply with 'COPY' or 'PASS' followed by your confidence in that decision "
+        "as a number between 0 and 1, e.g. 'COPY 0.8' or 'PASS 0.35'."
+    ),
+}
+
 def chatbot_node(state: State):
-    system_msg = {
-        "role": "system",
-        "content": (
-            "You are a trade analyzing assistant. "
-            "Given the trade information, your task is to decide whether the trade is worth copying or not"
-            "Output 'COPY' or 'PASS' based on the decision."
-        ),
-    }
     response = llm.invoke([system_msg] + state["messages"])
     return {"messages": [response]}
 
+async def achatbot_node(state: State):
+    response = await llm.ainvoke([system_msg] + state["messages"])
+    return {"messages": [response]}
+
 graph = StateGraph(State)
 graph.set_entry_point("chatbot_node")
-graph.add_node("chatbot_node", chatbot_node)
+# Sync and native async implementations, used by `invoke` and `ainvoke` respectively
+graph.add_node("chatbot_node", RunnableLambda(chatbot_node, afunc=achatbot_node))
 
 compiled_graph = graph.compile()
 
+# Micro-batching: trades arriving within the window share one LLM request
+ANALYSIS_BATCH_WINDOW = float(os.getenv("ANALYSIS_BATCH_WINDOW", 0.05))  # seconds
+ANALYSIS_BATCH_MAX = int(os.getenv("ANALYSIS_BATCH_MAX", 8))             # 1 disables batching
+
+_analysis_semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+
+# A confidence directly follows the verdict ("COPY 0.8", "PASS: .35"); a bare 0 / 1 must also end
+# the clause ("COPY 1."), so text like "PASS - 0 liquidity" or "PASS 0 liquidity" is not read as one
+_DECISION_WORD = re.compile(r"\b(COPY|PASS)\b(?:[ \t]*:?[ \t]*(\d*\.\d+(?!\.?\d)|[01](?!\.?\d)(?=[ \t]*(?:$|[).,;]))))?", re.IGNORECASE | re.MULTILINE)
+_DECISION_LINE = re.compile(r"^\W*(?:trade\s*)?(\d+)\W+(COPY|PASS)\b", re.IGNORECASE | re.MULTILINE)
+
+def trade_prompt(trade_data: dict):
+    return f"Analyze this Solana trade:\n{trade_data}"
+
+def batch_prompt(trades: list[dict]):
+    lines = [
+        f"Analyze these {len(trades)} Solana trades independently.",
+        "Reply with exactly one line per trade in the form `<trade number>: COPY` or `<trade number>: PASS`.",
+    ]
+    for number, trade_data in enumerate(trades, 1):
+        lines.append(f"\nTrade {number}:\n{trade_data}")
+    return "\n".join(lines)
+
+def message_text(message):
+    content = message.content
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return content
+
+def parse_decision(text: str):
+    """Returns (Decision, confidence or None) from a model reply. Replies without a verdict count as PASS."""
+    match = _DECISION_WORD.search(text or "")
+    if match is None:
+        return Decision.PASS, None
+    confidence = float(match.group(2)) if match.group(2) else None
+    if confidence is not None and confidence > 1:
+        confidence = None
+    return Decision(match.group(1).upper()), confidence
+
+def parse_batch_decisions(text: str, count: int):
+    """Maps trade number (1-based) to 'COPY' / 'PASS' from a batched reply."""
+    decisions = {}
+    for number, decision in _DECISION_LINE.findall(text):
+        number = int(number)
+        if 1 <= number <= count and number not in decisions:
+            decisions[number] = decision.upper()
+    return decisions
+
+async def _run_analysis(content: str):
+    """Runs the graph on the event loop (`ainvoke`) with bounded concurrency and a per-call timeout."""
+    async with _analysis_semaphore:
+        return await asyncio.wait_for(
+            compiled_graph.ainvoke({"messages": [{"role": "user", "content": content}]}),
+            ANALYSIS_TIMEOUT,
+        )
+
+async def _resolve_single(trade_data, future):
+    try:
+        state = await _run_analysis(trade_prompt(trade_data))
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+    else:
+        if not future.done():
+            future.set_result(state)
+
+async def _flush_trades(batch):
+    """
+    MicroBatcher flush: packs the trades into one structured prompt and resolves each caller
+    with its own COPY/PASS decision. Trades the reply doesn't cover are re-analyzed individually.
+    """
+    if len(batch) == 1:
+        await _resolve_single(*batch[0])
+        return
+
+    state = await _run_analysis(batch_prompt([trade_data for trade_data, _ in batch]))
+    decisions = parse_batch_decisions(message_text(state["messages"][-1]), len(batch))
+    fallbacks = []
+    for number, (trade_data, future) in enumerate(batch, 1):
+        decision = decisions.get(number)
+        if decision is None:
+            fallbacks.append(_resolve_single(trade_data, future))
+        elif not future.done():
+            future.set_result({"messages": [HumanMessage(trade_prompt(trade_data)), AIMessage(decision)]})
+    await asyncio.gather(*fallbacks)
+
+_trade_batcher = MicroBatcher(_flush_trades, ANALYSIS_BATCH_WINDOW, ANALYSIS_BATCH_MAX)
+
+# Decision cache: near-identical trades from the same wallet reuse a recent decision
+DECISION_CACHE_TTL = float(os.getenv("DECISION_CACHE_TTL", 300))  # seconds
+AMOUNT_BUCKETS_PER_DECADE = 4   # amounts within ~78% of each other share a bucket
+PRICE_BUCKET_RATIO = 1.05       # prices within ~5% of each other share a bucket
+
+decision_cache = TTLCache(ttl=DECISION_CACHE_TTL, max_size=10_000)
+
+def _log_bucket(value, base):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return 0 if value == 0 else None
+    return round(math.log(value, base))
+
+def trade_fingerprint(trade_data: dict):
+    """
+    Normalized key of a trade: (wallet, mint, direction, bucketed amount, bucketed price).
+    Returns None when the trade has no mint to key on.
+    """
+    trade_context = trade_data.get("trade_context") or {}
+    mint = trade_context.get("mint")
+    if not mint:
+        return None
+    return (
+        trade_data.get("wallet"),
+        mint,
+        trade_context.get("direction"),
+        _log_bucket(trade_context.get("amount"), 10 ** (1 / AMOUNT_BUCKETS_PER_DECADE)),
+        _log_bucket(trade_context.get("price_usd"), PRICE_BUCKET_RATIO),
+    )
+
+def get_decision_cache_stats():
+    return decision_cache.stats()
+
+async def _analyze_uncached(trade_data: dict):
+    if ANALYSIS_BATCH_MAX <= 1:
+        return await _run_analysis(trade_prompt(trade_data))
+    return await _trade_batcher.submit(trade_data)
+
+async def analyze_trade(trade_data: dict, use_cache: bool = True):
+    """
+    Analyzes one trade, micro-batched with other trades arriving within ANALYSIS_BATCH_WINDOW.
+    Repeats of a recent trade fingerprint are answered from the decision cache unless `use_cache` is False.
+    Returns the graph state ({"messages": [..., decision]}).
+    Raises `asyncio.TimeoutError` if the model doesn't answer within ANALYSIS_TIMEOUT.
+    """
+    fingerprint = trade_fingerprint(trade_data) if use_cache else None
+    if fingerprint is None:
+        return await _analyze_uncached(trade_data)
+
+    state = None
+
+    async def fetch():
+        nonlocal state
+        state = await _analyze_uncached(trade_data)
+        return message_text(state["messages"][-1])
+
+    decision = await decision_cache.get_or_fetch(fingerprint, fetch)
+    if state is not None:
+        return state
+    return {"messages": [HumanMessage(trade_prompt(trade_data)), AIMessage(decision)]}
+
+async def analyze_trade_decision(trade_data: dict, use_cache: bool = True):
+    """`analyze_trade`, reduced to a compact `TradeDecision`."""
+    start = time.perf_counter()
+    state = await analyze_trade(trade_data, use_cache=use_cache)
+    decision, confidence = parse_decision(message_text(state["messages"][-1]))
+    return TradeDecision(
+        decision=decision,
+        confidence=confidence,
+        latency_ms=1000 * (time.perf_counter() - start),
+        model=MODEL_NAME,
+    )
+
+async def stream_trade_decision(trade_data: dict, use_cache: bool = True):
+    """
+    Streams the analysis of one trade. Yields ("decision", TradeDecision) as soon as the model
+    has produced COPY or PASS, then ("done", TradeDecision) once the full reply is in.
+    """
+    start = time.perf_counter()
+    fingerprint = trade_fingerprint(trade_data) if use_cache else None
+    cached = decision_cache.get(fingerprint) if fingerprint is not None else None
+    if cached is not None:
+        decision, confidence = parse_decision(cached)
+        result = TradeDecision(decision=decision, confidence=confidence, latency_ms=1000 * (time.perf_counter() - start), model=MODEL_NAME)
+        yield "decision", result
+        yield "done", result
+        return
+
+    text = ""
+    emitted = False
+    # Same bounds as _run_analysis: the semaphore, and ANALYSIS_TIMEOUT for the whole stream
+    deadline = time.perf_counter() + ANALYSIS_TIMEOUT
+    async with _analysis_semaphore:
+        stream = compiled_graph.astream({"messages": [{"role": "user", "content": trade_prompt(trade_data)}]}, stream_mode="messages")
+        try:
+            while True:
+                try:
+                    chunk, _ = await asyncio.wait_for(anext(stream), deadline - time.perf_counter())
+                except StopAsyncIteration:
+                    break
+                text += message_text(chunk)
+                if emitted:
+                    continue
+                match = _DECISION_WORD.search(text)
+                # Wait for one more character so a verdict word isn't judged on a partial token
+                if match is not None and match.end(1) < len(text):
+                    emitted = True
+                    yield "decision", TradeDecision(
+                        decision=Decision(match.group(1).upper()),
+                        latency_ms=1000 * (time.perf_counter() - start),
+                        model=MODEL_NAME,
+                    )
+        finally:
+            await stream.aclose()
+
+    if fingerprint is not None:
+        decision_cache.set(fingerprint, text)
+    decision, confidence = parse_decision(text)
+    result = TradeDecision(decision=decision, confidence=confidence, latency_ms=1000 * (time.perf_counter() - start), model=MODEL_NAME)
+    if not emitted:
+        yield "decision", result
+    yield "done", result
+
 if __name__ == "__main__":
     response = compiled_graph.invoke({"messages": [{"role": "user", "content": "Who is Walter White?"}]})
     print(response)
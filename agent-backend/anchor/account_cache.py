@@ -0,0 +1,237 @@
+from solana.rpc.websocket_api import connect
+from solders.pubkey import Pubkey
+from solders.rpc.config import RpcAccountInfoConfig
+from solders.account_decoder import UiAccountEncoding
+from solders.rpc.requests import AccountSubscribe, AccountUnsubscribe
+from solders.rpc.responses import AccountNotification, SubscriptionResult
+from anchor.client import get_rpc_client, get_user_account_pda, decode_user_account, decode_config_account
+from cache import TTLCache
+from hub import WS_URL, SUBSCRIBE_TIMEOUT, backoff_delay
+from collections import OrderedDict
+from typing import Callable
+import asyncio
+import os
+
+# ----------------------------
+# Read-through cache of decoded program accounts
+# ----------------------------
+SLOT_SECONDS = 0.4  # approximate slot time, used to express the fallback TTL in slots
+ACCOUNT_CACHE_TTL_SLOTS = int(os.getenv("ACCOUNT_CACHE_TTL_SLOTS", 150))                  # re-read from RPC after this many slots
+ACCOUNT_CACHE_MAX_SUBSCRIPTIONS = int(os.getenv("ACCOUNT_CACHE_MAX_SUBSCRIPTIONS", 1000))  # hot accounts kept live via accountSubscribe
+
+
+class AccountStateCache:
+    """
+    Decoded account state keyed by PDA.
+
+    A miss reads the account from the RPC and opens one `accountSubscribe` for that PDA, after
+    which notifications replace the cached value in place. Entries still expire after
+    `ttl_slots` so a missed notification can't serve stale state forever. If the socket drops,
+    every entry is invalidated and the next read re-subscribes. Subscribing runs in the
+    background, so a read never waits on the socket; after a failed connect, new subscriptions
+    are skipped for a jittered backoff. At `max_subscriptions`, the least recently read account
+    is unsubscribed to make room, so the live set follows the hot accounts.
+    """
+
+    def __init__(self, ws_url: str = WS_URL, ttl_slots: int = ACCOUNT_CACHE_TTL_SLOTS, max_subscriptions: int = ACCOUNT_CACHE_MAX_SUBSCRIPTIONS):
+        self.ws_url = ws_url
+        self.max_subscriptions = max_subscriptions
+        self.cache = TTLCache(ttl=ttl_slots * SLOT_SECONDS, max_size=10 * max_subscriptions)
+        self.websocket = None
+        self._reader: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._slots: dict[str, int] = {}                 # pda -> slot of the cached value
+        self._decoders: OrderedDict[str, Callable] = OrderedDict()  # watched pda -> decoder, least recently read first
+        self.pda_to_sub: dict[str, int] = {}
+        self.sub_to_pda: dict[int, str] = {}
+        self._pending: dict[int, tuple[str, asyncio.Future]] = {}  # request id -> (pda, confirmation)
+        self._tasks: set[asyncio.Task] = set()
+        self._connect_failures = 0
+        self._retry_at = 0.0  # loop time before which no new connect is attempted
+        self.updates = 0
+
+    async def get(self, pda: Pubkey, decode):
+        """Returns `decode(data)` for the account at `pda`, or None if it doesn't exist."""
+        key = str(pda)
+        if key in self._decoders:
+            self._decoders.move_to_end(key)
+
+        async def fetch():
+            self._start_watch(key, decode)
+            client = await get_rpc_client()
+            resp = await client.get_account_info(pda)
+            # A notification newer than this read may have landed while it was in flight
+            if self._slots.get(key, -1) > resp.context.slot:
+                return self.cache.peek(key)
+            self._slots[key] = resp.context.slot
+            return decode(resp.value.data) if resp.value and resp.value.data else None
+
+        return await self.cache.get_or_fetch(key, fetch)
+
+    def apply(self, pda: str, data: bytes, slot: int):
+        """Replaces the cached value of `pda` unless `slot` is older than what we hold."""
+        if self._slots.get(pda, -1) > slot:
+            return
+        decode = self._decoders.get(pda)
+        try:
+            value = decode(data) if decode and data else None
+        except Exception as e:
+            print(f"Could not decode account {pda}: {e}")
+            self.cache.invalidate(pda)
+            return
+        self._slots[pda] = slot
+        self.cache.set(pda, value)
+        self.updates += 1
+
+    # ----------------------------
+    # accountSubscribe
+    # ----------------------------
+    def _start_watch(self, pda: str, decode):
+        """Subscribes to `pda` once, in the background. Failures only cost the live updates; reads fall back to the TTL."""
+        if pda in self._decoders:
+            return
+        if self.websocket is None and asyncio.get_running_loop().time() < self._retry_at:
+            return
+        if len(self._decoders) >= self.max_subscriptions:
+            self._unwatch(next(iter(self._decoders)))
+        self._decoders[pda] = decode
+        self._spawn(self._watch(pda))
+
+    def _unwatch(self, pda: str):
+        """Drops the live subscription of `pda`; its cached value falls back to the TTL."""
+        self._decoders.pop(pda, None)
+        subscription_id = self.pda_to_sub.pop(pda, None)
+        if subscription_id is not None:
+            self.sub_to_pda.pop(subscription_id, None)
+            self._spawn(self._unsubscribe(subscription_id))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _watch(self, pda: str):
+        try:
+            async with self._lock:
+                if self.websocket is None:
+                    if asyncio.get_running_loop().time() < self._retry_at:
+                        raise ConnectionError("account subscription socket is backing off")
+                    try:
+                        self.websocket = await connect(self.ws_url)
+                    except Exception:
+                        self._retry_at = asyncio.get_running_loop().time() + backoff_delay(self._connect_failures)
+                        self._connect_failures += 1
+                        raise
+                    self._connect_failures = 0
+                    self._reader = asyncio.create_task(self._read_loop())
+            await self._subscribe(pda)
+        except Exception as e:
+            self._decoders.pop(pda, None)
+            print(f"accountSubscribe failed for {pda}: {e}")
+
+    async def _subscribe(self, pda: str):
+        request_id = self.websocket.increment_counter_and_get_id()
+        confirmation = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (pda, confirmation)
+        config = RpcAccountInfoConfig(encoding=UiAccountEncoding.Base64)
+        try:
+            await self.websocket.send_data(AccountSubscribe(Pubkey.from_string(pda), config, request_id))
+            return await asyncio.wait_for(confirmation, SUBSCRIBE_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _unsubscribe(self, subscription_id: int):
+        websocket = self.websocket
+        if websocket is None:
+            return
+        try:
+            await websocket.send_data(AccountUnsubscribe(subscription_id, websocket.increment_counter_and_get_id()))
+        except Exception as e:
+            print(f"accountUnsubscribe failed for subscription {subscription_id}: {e}")
+
+    async def _read_loop(self):
+        try:
+            while True:
+                for msg in await self.websocket.recv():
+                    if isinstance(msg, SubscriptionResult):
+                        pending = self._pending.get(msg.id)
+                        if pending is not None and not pending[1].done():
+                            pda, confirmation = pending
+                            if pda in self._decoders and pda not in self.pda_to_sub:
+                                self.pda_to_sub[pda] = msg.result
+                                self.sub_to_pda[msg.result] = pda
+                            else:
+                                # Evicted (or re-watched) while the subscribe was in flight
+                                self._spawn(self._unsubscribe(msg.result))
+                            confirmation.set_result(msg.result)
+                    elif isinstance(msg, AccountNotification):
+                        pda = self.sub_to_pda.get(msg.subscription)
+                        if pda is not None:
+                            account = msg.result.value
+                            self.apply(pda, bytes(account.data) if account else b"", msg.result.context.slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Account subscription connection lost ({len(self.pda_to_sub)} accounts): {e}")
+            for _, confirmation in self._pending.values():
+                if not confirmation.done():
+                    confirmation.set_exception(e)
+            websocket = self.websocket
+            self._reset()
+            # Nobody reads the old socket any more; close it so the node stops pushing to it
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    def _reset(self):
+        """Forgets every subscription and the state they kept fresh."""
+        self.websocket = None
+        self._reader = None
+        self._decoders.clear()
+        self.pda_to_sub.clear()
+        self.sub_to_pda.clear()
+        self._slots.clear()
+        self.cache.clear()
+
+    def stats(self):
+        return {
+            **self.cache.stats(),
+            "subscriptions": len(self.pda_to_sub),
+            "updates": self.updates,
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.websocket is not None:
+            await self.websocket.close()
+        self._reset()
+
+
+_account_cache: AccountStateCache | None = None
+
+def get_account_cache() -> AccountStateCache:
+    global _account_cache
+    if _account_cache is None:
+        _account_cache = AccountStateCache()
+    return _account_cache
+
+async def close_account_cache():
+    """Closes the accountSubscribe socket. Called from the FastAPI lifespan on shutdown."""
+    global _account_cache
+    if _account_cache is not None:
+        await _account_cache.close()
+    _account_cache = None
+
+async def get_cached_user_account_data(user_pubkey: str):
+    """`get_user_account_data`, served from the account cache."""
+    pda = await get_user_account_pda(user_pubkey=user_pubkey)
+    return await get_account_cache().get(pda, decode_user_account)
+
+async def get_cached_config_account_data(config_pda_pubkey: str):
+    """`get_config_account_data`, served from the account cache."""
+    return await get_account_cache().get(Pubkey.from_string(config_pda_pubkey), decode_config_account)
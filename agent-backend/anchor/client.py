@@ -1,84 +1,194 @@
 from solana.rpc.async_api import AsyncClient
 from solders.pubkey import Pubkey
-from models.schemas import UserAccountLayout, GlobalConfigLayout
+from solders.keypair import Keypair
+from models.schemas import unpack_user_account, unpack_global_config
+from pipeline import log
 from anchorpy import Program, Provider, Wallet, Idl
+from functools import lru_cache
+import asyncio
 import base64
+import hashlib
+import json
+import os
+import re
+import struct
 
 # ----------------------------
 # 1. Load Environment Variables
 # ----------------------------
-RPC_URL = "https://api.devnet.solana.com"  # devnet RPC
+RPC_URL = os.getenv("RPC_URL", "https://api.devnet.solana.com")  # devnet RPC
 PROGRAM_ID = Pubkey.from_string("5xh8w4ihrnrzZo7F6tsdLXRpASTkdGYzfcMEja6vz7wX")  # Replace with your deployed program ID
-IDL_PATH =  ".\\anchor\\idl.json"                      # Export this from Anchor build folder
+IDL_PATH = os.path.join(os.path.dirname(__file__), "idl.json")  # Export this from Anchor build folder
 SYS_PROGRAM_ID = Pubkey.from_string("11111111111111111111111111111111")
 
 # ----------------------------
 # 2. Load IDL / Program (No keypair needed anymore)
 # ----------------------------
+_program: Program | None = None
+
 async def get_program():
     """
-    Loads the Anchor program client with a dummy wallet (since backend never signs tx).
+    Returns the process-wide Anchor program client with a dummy wallet (since backend never signs tx).
+    The IDL is parsed and the RPC client created once, on first use (or at startup via `init_program`).
     """
-    client = AsyncClient(RPC_URL)
-    dummy_wallet = Wallet.local()
-    provider = Provider(client, dummy_wallet)
-
-    with open(IDL_PATH, "r") as f:
-        idl = Idl.from_json(f.read())
-
-    program = Program(idl, PROGRAM_ID, provider)
-    return program
+    global _program
+    if _program is None:
+        client = AsyncClient(RPC_URL)
+        dummy_wallet = Wallet(Keypair())
+        provider = Provider(client, dummy_wallet)
+
+        with open(IDL_PATH, "r") as f:
+            idl = Idl.from_json(f.read())
+
+        _program = Program(idl, PROGRAM_ID, provider)
+    return _program
+
+async def init_program():
+    """Builds the shared program client. Called from the FastAPI lifespan on startup."""
+    return await get_program()
+
+async def close_program():
+    """Closes the shared program's RPC client. Called from the FastAPI lifespan on shutdown."""
+    global _program
+    if _program is not None:
+        await _program.close()
+    _program = None
+
+async def get_rpc_client() -> AsyncClient:
+    """Returns the RPC client owned by the shared program provider."""
+    program = await get_program()
+    return program.provider.connection
 
 # ----------------------------
 # 3. PDA Helpers
 # ----------------------------
+PDA_CACHE_SIZE = 10_000  # derived addresses kept in memory (LRU)
+
+@lru_cache(maxsize=PDA_CACHE_SIZE)
+def find_pda(seeds: tuple[bytes, ...]) -> Pubkey:
+    """
+    Memoized `find_program_address` for PROGRAM_ID, keyed by the seed tuple.
+    Skips the bump-seed search for keys we have already derived.
+    """
+    pda, _ = Pubkey.find_program_address(list(seeds), PROGRAM_ID)
+    return pda
+
+def get_pda_cache_stats():
+    """Hit/miss counters of the PDA cache."""
+    info = find_pda.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
 async def get_global_config_pda(admin_pubkey: str, unique_key: str):
     """Use correct PDA derivation as per your Anchor seeds """
-    program = await get_program()
-    pda, _ = Pubkey.find_program_address(
-        [
-            b"admin",
-            bytes(unique_key, "utf-8"),
-            bytes(Pubkey.from_string(admin_pubkey))
-        ],
-        program.program_id
-    )
-    return pda
+    return find_pda((
+        b"admin",
+        bytes(unique_key, "utf-8"),
+        bytes(Pubkey.from_string(admin_pubkey))
+    ))
 
 async def get_user_account_pda(user_pubkey: str):
     """Derive user account PDA based on user's public key """
-    program = await get_program()
-    pda, _ = Pubkey.find_program_address(
-        [
-            b"user",
-            bytes(Pubkey.from_string(user_pubkey))
-        ],
-        program.program_id
-    )
-    return pda
+    return find_pda((
+        b"user",
+        bytes(Pubkey.from_string(user_pubkey))
+    ))
+
+async def get_user_account_pdas(user_pubkeys: list[str]):
+    """Derive user account PDAs for many users in one call, preserving input order."""
+    return [
+        find_pda((b"user", bytes(Pubkey.from_string(user_pubkey))))
+        for user_pubkey in user_pubkeys
+    ]
 
 async def get_account_data(pubkey: Pubkey):
     """Fetch PDA account data based on PDA's public key"""
 
-    client = AsyncClient(RPC_URL)
+    client = await get_rpc_client()
     info  = await client.get_account_info(pubkey=pubkey)
     if not info.value or not info.value.data:
-        print("❌ Account has no data or is uninitialized.")
+        log("❌ Account has no data or is uninitialized.")
         return None
     return info
 
+MULTIPLE_ACCOUNTS_CHUNK = 100  # getMultipleAccounts accepts at most 100 keys per call
+
+def account_discriminator(name: str):
+    """First 8 bytes of every Anchor account of type `name`."""
+    return hashlib.sha256(f"account:{name}".encode()).digest()[:8]
+
+USER_ACCOUNT_DISCRIMINATOR = account_discriminator("UserAccount")
+GLOBAL_CONFIG_DISCRIMINATOR = account_discriminator("GlobalConfig")
+
+def account_mismatch(account, discriminator: bytes):
+    """Why `account` is not a PROGRAM_ID account of the expected type, or None if it is."""
+    if account.owner != PROGRAM_ID:
+        return f"Account is owned by {account.owner}, not {PROGRAM_ID}"
+    if bytes(account.data[:8]) != discriminator:
+        return "Account discriminator does not match"
+    return None
+
+async def get_multiple_accounts_data(pubkeys: list[Pubkey], discriminator: bytes):
+    """
+    Fetch many accounts with chunked `getMultipleAccounts` calls.
+    Returns (raw data, error) per key, in input order: (None, None) for missing accounts and
+    (None, reason) for accounts not owned by PROGRAM_ID or of another account type.
+    """
+    client = await get_rpc_client()
+    chunks = [pubkeys[i:i + MULTIPLE_ACCOUNTS_CHUNK] for i in range(0, len(pubkeys), MULTIPLE_ACCOUNTS_CHUNK)]
+    responses = await asyncio.gather(*(client.get_multiple_accounts(chunk) for chunk in chunks))
+
+    results = []
+    for resp in responses:
+        for account in resp.value:
+            if not account or not account.data:
+                results.append((None, None))
+                continue
+            error = account_mismatch(account, discriminator)
+            results.append((None, error) if error else (bytes(account.data), None))
+    return results
+
+def _decode_batch(keys: list[str], raw_accounts, decode):
+    """Decodes (raw data, error) pairs into ({key: decoded or None}, {key: error})."""
+    decoded, invalid = {}, {}
+    for key, (raw, error) in zip(keys, raw_accounts):
+        decoded[key] = None
+        if error is None and raw is not None:
+            try:
+                decoded[key] = decode(raw)
+            except (struct.error, UnicodeDecodeError) as e:
+                error = f"Could not decode account: {e}"
+        if error is not None:
+            invalid[key] = error
+    return decoded, invalid
+
 def decode_user_account(data: bytes):
     """Decode raw on-chain data of UserAccount PDA"""
-    obj = UserAccountLayout.parse(data)
+    _, user, total_paid, tasks_used, tasks_remaining, has_rated = unpack_user_account(data)
     
     return {
-        "user": str(Pubkey(obj.user)),
-        "total_paid": obj.total_paid,
-        "tasks_used": obj.tasks_used,
-        "tasks_remaining": obj.tasks_remaining,
-        "has_rated": bool(obj.has_rated),
+        "user": str(Pubkey(user)),
+        "total_paid": total_paid,
+        "tasks_used": tasks_used,
+        "tasks_remaining": tasks_remaining,
+        "has_rated": has_rated,
     }
 
+def decode_user_accounts(buffers: list[bytes]):
+    """Decode many UserAccount buffers into columns: {"user": [...], "total_paid": [...], ...}"""
+    columns = {"user": [], "total_paid": [], "tasks_used": [], "tasks_remaining": [], "has_rated": []}
+    for _, user, total_paid, tasks_used, tasks_remaining, has_rated in map(unpack_user_account, buffers):
+        columns["user"].append(str(Pubkey(user)))
+        columns["total_paid"].append(total_paid)
+        columns["tasks_used"].append(tasks_used)
+        columns["tasks_remaining"].append(tasks_remaining)
+        columns["has_rated"].append(has_rated)
+    return columns
+
 async def get_user_account_data(user_pubkey: str):
     user_account_pda = await get_user_account_pda(user_pubkey=user_pubkey)
     data = await get_account_data(user_account_pda)
@@ -92,14 +202,23 @@ async def get_user_account_data(user_pubkey: str):
 
 def decode_config_account(data: bytes):
     """Decode raw on-chain data of GlobalConfig PDA"""
-    obj = GlobalConfigLayout.parse(data)
+    _, admin, unique_key, agent_fee_lamports = unpack_global_config(data)
     
     return {
-        "admin": str(Pubkey(obj.admin)),
-        "unique_key": obj.unique_key.decode("utf-8"),
-        "agent_fee_lamports": obj.agent_fee_lamports
+        "admin": str(Pubkey(admin)),
+        "unique_key": unique_key.decode("utf-8"),
+        "agent_fee_lamports": agent_fee_lamports
     }
 
+def decode_config_accounts(buffers: list[bytes]):
+    """Decode many GlobalConfig buffers into columns: {"admin": [...], "unique_key": [...], ...}"""
+    columns = {"admin": [], "unique_key": [], "agent_fee_lamports": []}
+    for _, admin, unique_key, agent_fee_lamports in map(unpack_global_config, buffers):
+        columns["admin"].append(str(Pubkey(admin)))
+        columns["unique_key"].append(unique_key.decode("utf-8"))
+        columns["agent_fee_lamports"].append(agent_fee_lamports)
+    return columns
+
 async def get_config_account_data(config_pda_pubkey: str):
     data = await get_account_data(Pubkey.from_string(config_pda_pubkey))
 
@@ -110,135 +229,172 @@ async def get_config_account_data(config_pda_pubkey: str):
     decoded = decode_config_account(encoded_data)
     return decoded
 
+async def get_user_accounts_data(user_pubkeys: list[str]):
+    """
+    Fetch and decode many UserAccounts at once, keyed by user pubkey (None if not found or invalid).
+    Returns (accounts, invalid) where `invalid` maps keys to why their account was rejected.
+    """
+    pdas = await get_user_account_pdas(user_pubkeys)
+    raw_accounts = await get_multiple_accounts_data(pdas, USER_ACCOUNT_DISCRIMINATOR)
+    return _decode_batch(user_pubkeys, raw_accounts, decode_user_account)
+
+async def get_config_accounts_data(config_pda_pubkeys: list[str]):
+    """
+    Fetch and decode many GlobalConfigs at once, keyed by PDA pubkey (None if not found or invalid).
+    Returns (configs, invalid) where `invalid` maps keys to why their account was rejected.
+    """
+    pdas = [Pubkey.from_string(pda) for pda in config_pda_pubkeys]
+    raw_accounts = await get_multiple_accounts_data(pdas, GLOBAL_CONFIG_DISCRIMINATOR)
+    return _decode_batch(config_pda_pubkeys, raw_accounts, decode_config_account)
+
+# ----------------------------
+# 4. Instruction Templates
+# ----------------------------
+# Fixed-size Borsh arg types and their little-endian struct codes
+_BORSH_FORMATS = {
+    "bool": "?", "u8": "B", "i8": "b", "u16": "H", "i16": "h",
+    "u32": "I", "i32": "i", "u64": "Q", "i64": "q",
+}
+
+PROGRAM_ID_STR = str(PROGRAM_ID)
+
+def _snake_case(name: str):
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+class InstructionTemplate:
+    """
+    Precomputed layout of one IDL instruction: the Anchor discriminator, the ordered
+    account metas and a struct packer for the args. Building an instruction only packs
+    the args and fills in pubkeys; the output matches anchorpy's `program.methods[...]`.
+    """
+
+    def __init__(self, idl_instruction: dict):
+        self.name = _snake_case(idl_instruction["name"])
+        self.discriminator = hashlib.sha256(f"global:{self.name}".encode()).digest()[:8]
+        self.accounts = [
+            (_snake_case(account["name"]), account["isSigner"], account["isMut"])
+            for account in idl_instruction["accounts"]
+        ]
+        self.arg_types = [arg["type"] for arg in idl_instruction["args"]]
+
+        # All-fixed-size args pack with one precompiled struct, discriminator included
+        if all(arg_type in _BORSH_FORMATS for arg_type in self.arg_types):
+            self._struct = struct.Struct("<8s" + "".join(_BORSH_FORMATS[arg_type] for arg_type in self.arg_types))
+        else:
+            self._struct = None
+
+    def pack_args(self, args: list):
+        if self._struct is not None:
+            return self._struct.pack(self.discriminator, *args)
+
+        parts = [self.discriminator]
+        for arg_type, value in zip(self.arg_types, args):
+            if arg_type == "string":
+                encoded = value.encode("utf-8")
+                parts.append(struct.pack("<I", len(encoded)))
+                parts.append(encoded)
+            elif arg_type == "publicKey":
+                parts.append(bytes(value))
+            else:
+                parts.append(struct.pack("<" + _BORSH_FORMATS[arg_type], value))
+        return b"".join(parts)
+
+    def build(self, accounts: dict, args: list | None = None):
+        """Returns the instruction as the JSON dict the frontend signs."""
+        return {
+            "program_id": PROGRAM_ID_STR,
+            "keys": [
+                {
+                    "pubkey": str(accounts[name]),
+                    "is_signer": is_signer,
+                    "is_writable": is_writable,
+                }
+                for name, is_signer, is_writable in self.accounts
+            ],
+            "data": base64.b64encode(self.pack_args(args or [])).decode("utf-8"),
+        }
+
+def _load_instruction_templates():
+    with open(IDL_PATH, "r") as f:
+        idl = json.load(f)
+    templates = [InstructionTemplate(instruction) for instruction in idl["instructions"]]
+    return {template.name: template for template in templates}
+
+INSTRUCTION_TEMPLATES = _load_instruction_templates()
+
 # ----------------------------
-# 4. Initialize Global Config
+# 5. Initialize Global Config
 # ----------------------------
 async def build_initialize_global_config_tx(admin_pubkey: str, unique_key: str, agent_fee_lamports: int):
     """
     Instead of calling RPC directly, build and return an unsigned transaction.
     This will be signed by the frontend admin wallet.
     """
-    program = await get_program()
     global_config_pda = await get_global_config_pda(admin_pubkey=admin_pubkey, unique_key=unique_key)
     admin_publickey = Pubkey.from_string(admin_pubkey)
 
-    ix = program.methods["initialize_global_config"].accounts(
+    return INSTRUCTION_TEMPLATES["initialize_global_config"].build(
         {
             "admin_account": admin_publickey,
             "global_config": global_config_pda,
             "system_program": SYS_PROGRAM_ID,
-        }
-    ).args([unique_key, agent_fee_lamports]).instruction()
-
-    return {
-        "program_id": str(ix.program_id),
-        "keys": [
-            {
-                "pubkey": str(meta.pubkey),
-                "is_signer": meta.is_signer,
-                "is_writable": meta.is_writable
-            }
-            for meta in ix.accounts
-        ],
-        "data": base64.b64encode(bytes(ix.data)).decode("utf-8")
-    }
+        },
+        [unique_key, agent_fee_lamports],
+    )
 
 # ----------------------------
 # 6. User Deposit
 # ----------------------------
 async def build_deposit_tx(global_config_pda: str, user_pubkey: str, admin_pubkey: str, num_tasks: int):
     """Build an unsigned deposit transaction for the frontend to sign."""
-    program = await get_program()
     global_config_pda = Pubkey.from_string(global_config_pda)
     user_publickey = Pubkey.from_string(user_pubkey)
     user_account_pda = await get_user_account_pda(user_pubkey)
     admin_publickey = Pubkey.from_string(admin_pubkey)
 
-
-    ix = program.methods["user_deposit"].accounts(
+    return INSTRUCTION_TEMPLATES["user_deposit"].build(
         {
             "global_config": global_config_pda,
             "user_account": user_account_pda,
             "admin_account": admin_publickey,
             "user": user_publickey,
             "system_program": SYS_PROGRAM_ID,
-        }
-    ).args([num_tasks]).instruction()
-
-    return  {
-        "program_id": str(ix.program_id),
-        "keys": [
-            {
-                "pubkey": str(meta.pubkey),
-                "is_signer": meta.is_signer,
-                "is_writable": meta.is_writable,
-            }
-            for meta in ix.accounts
-        ],
-        "data": base64.b64encode(bytes(ix.data)).decode("utf-8"),
-    }
+        },
+        [num_tasks],
+    )
 
 # ----------------------------
-# 6. Build Execute Task Transaction
+# 7. Build Execute Task Transaction
 # ----------------------------
 async def build_execute_task_tx(user_pubkey: str):
     """
     Prepare unsigned transaction to call `execute_task` instruction.
     """
-    program = await get_program()
     user_publickey = Pubkey.from_string(user_pubkey)
     user_account_pda = await get_user_account_pda(user_pubkey)
 
-    ix = program.methods["execute_task"].accounts(
+    return INSTRUCTION_TEMPLATES["execute_task"].build(
         {
             "user_account": user_account_pda,
             "user": user_publickey,
             "system_program": SYS_PROGRAM_ID,
         }
-    ).instruction()
-
-    return  {
-        "program_id": str(ix.program_id),
-        "keys": [
-            {
-                "pubkey": str(meta.pubkey),
-                "is_signer": meta.is_signer,
-                "is_writable": meta.is_writable,
-            }
-            for meta in ix.accounts
-        ],
-        "data": base64.b64encode(bytes(ix.data)).decode("utf-8"),
-    }
+    )
 
 # ----------------------------
 # 8. Withdraw (Admin only)
 # ----------------------------
 async def build_withdraw_tx(global_config_pda: str, admin_pubkey: str):
     """Same unsigned transaction pattern for withdraw """
-
-    program = await get_program()
     global_config_pda = Pubkey.from_string(global_config_pda)
     admin_publickey = Pubkey.from_string(admin_pubkey)
 
-    ix = program.methods["withdraw"].accounts(
+    return INSTRUCTION_TEMPLATES["withdraw"].build(
         {
             "global_config": global_config_pda,
             "admin_account": admin_publickey,
         }
-    ).instruction()
-
-    return  {
-        "program_id": str(ix.program_id),
-        "keys": [
-            {
-                "pubkey": str(meta.pubkey),
-                "is_signer": meta.is_signer,
-                "is_writable": meta.is_writable,
-            }
-            for meta in ix.accounts
-        ],
-        "data": base64.b64encode(bytes(ix.data)).decode("utf-8"),
-    }
+    )
 
 
 # ----------------------------
@@ -0,0 +1,205 @@
+from solana.rpc.types import MemcmpOpts
+from solana.rpc.websocket_api import connect
+from solders.rpc.responses import ProgramNotification
+from anchor.client import (
+    PROGRAM_ID,
+    USER_ACCOUNT_DISCRIMINATOR,
+    GLOBAL_CONFIG_DISCRIMINATOR,
+    get_rpc_client,
+    decode_user_accounts,
+    decode_config_accounts
+)
+from hub import WS_URL
+import asyncio
+import os
+import sqlite3
+
+# ----------------------------
+# Local index of every account owned by PROGRAM_ID
+# ----------------------------
+ACCOUNT_INDEX_PATH = os.getenv("ACCOUNT_INDEX_PATH", "account_index.sqlite")
+ACCOUNT_INDEX_ENABLED = os.getenv("ACCOUNT_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+RESUBSCRIBE_DELAY = 5  # seconds before reopening a dropped programSubscribe socket
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_accounts (
+    pda TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    total_paid INTEGER NOT NULL,
+    tasks_used INTEGER NOT NULL,
+    tasks_remaining INTEGER NOT NULL,
+    has_rated INTEGER NOT NULL,
+    slot INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS user_accounts_user ON user_accounts (user);
+CREATE INDEX IF NOT EXISTS user_accounts_tasks_remaining ON user_accounts (tasks_remaining);
+CREATE TABLE IF NOT EXISTS global_configs (
+    pda TEXT PRIMARY KEY,
+    admin TEXT NOT NULL,
+    unique_key TEXT NOT NULL,
+    agent_fee_lamports INTEGER NOT NULL,
+    slot INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS global_configs_admin ON global_configs (admin);
+"""
+
+# Older slots never overwrite newer state
+_UPSERT_USER = """
+INSERT INTO user_accounts VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (pda) DO UPDATE SET
+    user = excluded.user, total_paid = excluded.total_paid, tasks_used = excluded.tasks_used,
+    tasks_remaining = excluded.tasks_remaining, has_rated = excluded.has_rated, slot = excluded.slot
+WHERE excluded.slot >= user_accounts.slot
+"""
+_UPSERT_CONFIG = """
+INSERT INTO global_configs VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (pda) DO UPDATE SET
+    admin = excluded.admin, unique_key = excluded.unique_key,
+    agent_fee_lamports = excluded.agent_fee_lamports, slot = excluded.slot
+WHERE excluded.slot >= global_configs.slot
+"""
+
+
+class AccountIndex:
+    """SQLite store of decoded UserAccount / GlobalConfig accounts, keyed by PDA and indexed by user / admin."""
+
+    def __init__(self, path: str = ACCOUNT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def upsert_users(self, pdas: list[str], buffers: list[bytes], slot: int):
+        columns = decode_user_accounts(buffers)
+        rows = zip(
+            pdas, columns["user"], columns["total_paid"], columns["tasks_used"],
+            columns["tasks_remaining"], map(int, columns["has_rated"]), [slot] * len(pdas),
+        )
+        with self.conn:
+            self.conn.executemany(_UPSERT_USER, rows)
+
+    def upsert_configs(self, pdas: list[str], buffers: list[bytes], slot: int):
+        columns = decode_config_accounts(buffers)
+        rows = zip(pdas, columns["admin"], columns["unique_key"], columns["agent_fee_lamports"], [slot] * len(pdas))
+        with self.conn:
+            self.conn.executemany(_UPSERT_CONFIG, rows)
+
+    def apply(self, pda: str, data: bytes, slot: int):
+        """Applies one account update (e.g. from programSubscribe). Closed accounts are removed."""
+        discriminator = bytes(data[:8])
+        try:
+            if discriminator == USER_ACCOUNT_DISCRIMINATOR:
+                self.upsert_users([pda], [data], slot)
+                return
+            if discriminator == GLOBAL_CONFIG_DISCRIMINATOR:
+                self.upsert_configs([pda], [data], slot)
+                return
+        except Exception as e:
+            print(f"Could not decode account {pda}: {e}")
+        with self.conn:
+            self.conn.execute("DELETE FROM user_accounts WHERE pda = ?", (pda,))
+            self.conn.execute("DELETE FROM global_configs WHERE pda = ?", (pda,))
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def summary(self):
+        users = self.conn.execute("""
+            SELECT COUNT(*) AS users,
+                   COALESCE(SUM(total_paid), 0) AS total_paid,
+                   COALESCE(SUM(tasks_used), 0) AS tasks_used,
+                   COALESCE(SUM(tasks_remaining), 0) AS tasks_remaining,
+                   COALESCE(SUM(tasks_remaining > 0), 0) AS users_with_tasks_remaining
+            FROM user_accounts
+        """).fetchone()
+        configs = self.conn.execute("SELECT COUNT(*) AS configs, COUNT(DISTINCT admin) AS admins FROM global_configs").fetchone()
+        return {**dict(users), **dict(configs)}
+
+    def users_with_tasks_remaining(self, min_tasks_remaining: int = 1, limit: int = 100, offset: int = 0):
+        rows = self.conn.execute(
+            "SELECT * FROM user_accounts WHERE tasks_remaining >= ? ORDER BY tasks_remaining DESC, pda LIMIT ? OFFSET ?",
+            (min_tasks_remaining, limit, offset),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def user(self, user_pubkey: str):
+        row = self.conn.execute("SELECT * FROM user_accounts WHERE user = ?", (user_pubkey,)).fetchone()
+        return dict(row) if row else None
+
+    def configs(self, admin: str | None = None):
+        if admin is None:
+            rows = self.conn.execute("SELECT * FROM global_configs ORDER BY admin, unique_key").fetchall()
+        else:
+            rows = self.conn.execute("SELECT * FROM global_configs WHERE admin = ? ORDER BY unique_key", (admin,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def fees_by_admin(self):
+        rows = self.conn.execute("""
+            SELECT admin, COUNT(*) AS configs, SUM(agent_fee_lamports) AS agent_fee_lamports
+            FROM global_configs GROUP BY admin ORDER BY admin
+        """).fetchall()
+        return [dict(row) for row in rows]
+
+
+async def snapshot_program_accounts(index: AccountIndex):
+    """
+    Pulls every UserAccount and GlobalConfig owned by PROGRAM_ID (filtered by discriminator)
+    and bulk-decodes them into the index.
+    """
+    client = await get_rpc_client()
+    # Read before the snapshot, so rows are stamped with a lower bound of the data's slot and
+    # programSubscribe updates that race the snapshot still win
+    slot = (await client.get_slot()).value
+    user_resp, config_resp = await asyncio.gather(
+        client.get_program_accounts(PROGRAM_ID, encoding="base64", filters=[MemcmpOpts(offset=0, bytes=USER_ACCOUNT_DISCRIMINATOR)]),
+        client.get_program_accounts(PROGRAM_ID, encoding="base64", filters=[MemcmpOpts(offset=0, bytes=GLOBAL_CONFIG_DISCRIMINATOR)]),
+    )
+
+    users = [(str(keyed.pubkey), bytes(keyed.account.data)) for keyed in user_resp.value]
+    configs = [(str(keyed.pubkey), bytes(keyed.account.data)) for keyed in config_resp.value]
+    if users:
+        index.upsert_users(*map(list, zip(*users)), slot)
+    if configs:
+        index.upsert_configs(*map(list, zip(*configs)), slot)
+    return {"users": len(users), "configs": len(configs), "slot": slot}
+
+
+async def watch_program_accounts(index: AccountIndex, ws_url: str = WS_URL):
+    """
+    Keeps the index current: subscribes to programSubscribe for PROGRAM_ID, then takes a
+    snapshot so nothing changed before the subscription is missed. Reconnects on failure.
+    """
+    while True:
+        try:
+            async with connect(ws_url) as websocket:
+                await websocket.program_subscribe(PROGRAM_ID, encoding="base64")
+                await snapshot_program_accounts(index)
+
+                async for messages in websocket:
+                    for msg in messages if isinstance(messages, list) else [messages]:
+                        if isinstance(msg, ProgramNotification):
+                            keyed = msg.result.value
+                            index.apply(str(keyed.pubkey), bytes(keyed.account.data), msg.result.context.slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Program account watcher error: {e}")
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+
+_index: AccountIndex | None = None
+
+def get_account_index() -> AccountIndex:
+    global _index
+    if _index is None:
+        _index = AccountIndex()
+    return _index
+
+def close_account_index():
+    global _index
+    if _index is not None:
+        _index.close()
+    _index = None
@@ -0,0 +1,90 @@
+"""
+Account decoding: `construct` layouts vs the precompiled `struct` decoders.
+
+Checks the struct decoders against the construct layouts on randomized accounts
+(including truncated buffers, which must fail in both), then reports decode rates.
+
+    cd agent-backend && python -m benchmarks.bench_decoders
+"""
+import os
+import random
+import struct
+import time
+
+from construct import ConstructError
+from models.schemas import (
+    GlobalConfigLayout,
+    UserAccountLayout,
+    decode_user_accounts_array,
+    np,
+    unpack_global_config,
+    unpack_user_account,
+)
+from anchor.client import decode_user_accounts
+
+SAMPLES = 20_000
+
+
+def random_user_account():
+    return (
+        os.urandom(8) + os.urandom(32)
+        + struct.pack("<QBB", random.getrandbits(64), random.getrandbits(8), random.getrandbits(8))
+        + bytes([random.choice([0, 1, 2, 255])])
+    )
+
+
+def random_global_config():
+    key = os.urandom(random.randint(0, 40))
+    return os.urandom(8) + os.urandom(32) + struct.pack("<I", len(key)) + key + struct.pack("<Q", random.getrandbits(64))
+
+
+def check_parity(users, configs):
+    for data in users:
+        obj = UserAccountLayout.parse(data)
+        assert unpack_user_account(data) == (obj.discriminator, obj.user, obj.total_paid, obj.tasks_used, obj.tasks_remaining, obj.has_rated)
+    for data in configs:
+        obj = GlobalConfigLayout.parse(data)
+        assert unpack_global_config(data) == (obj.discriminator, obj.admin, obj.unique_key, obj.agent_fee_lamports)
+
+    # Truncated buffers must be rejected by both decoders
+    for data in users[:100] + configs[:100]:
+        truncated = data[:random.randrange(len(data))]
+        layout, unpack = (UserAccountLayout, unpack_user_account) if data in users else (GlobalConfigLayout, unpack_global_config)
+        for decode in (layout.parse, unpack):
+            try:
+                decode(truncated)
+            except (ConstructError, struct.error):
+                continue
+            raise AssertionError(f"{decode} accepted a truncated buffer")
+
+    if np is not None:
+        array = decode_user_accounts_array(users)
+        columns = decode_user_accounts(users)
+        assert array["total_paid"].tolist() == columns["total_paid"]
+        assert array["has_rated"].tolist() == columns["has_rated"]
+        assert [bytes(user) for user in array["user"]] == [unpack_user_account(data)[1] for data in users]
+    print("parity: struct decoders match construct layouts")
+
+
+def rate(decode, buffers):
+    start = time.perf_counter()
+    for data in buffers:
+        decode(data)
+    return len(buffers) / (time.perf_counter() - start)
+
+
+def main():
+    users = [random_user_account() for _ in range(SAMPLES)]
+    configs = [random_global_config() for _ in range(SAMPLES)]
+    check_parity(users, configs)
+
+    print(f"UserAccount   construct {rate(UserAccountLayout.parse, users):>12,.0f}/s   struct {rate(unpack_user_account, users):>12,.0f}/s")
+    print(f"GlobalConfig  construct {rate(GlobalConfigLayout.parse, configs):>12,.0f}/s   struct {rate(unpack_global_config, configs):>12,.0f}/s")
+    if np is not None:
+        start = time.perf_counter()
+        decode_user_accounts_array(users)
+        print(f"UserAccount   numpy bulk {SAMPLES / (time.perf_counter() - start):>11,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Instruction-building throughput: anchorpy `program.methods[...]` (the previous
+implementation) vs the precomputed `InstructionTemplate` fast path.
+
+Checks both paths produce identical JSON, then reports requests/sec for the
+/deposit and /execute-task handlers' instruction building.
+
+    cd agent-backend && python -m benchmarks.bench_instructions
+"""
+import asyncio
+import base64
+import time
+
+from anchor.client import (
+    SYS_PROGRAM_ID,
+    build_deposit_tx,
+    build_execute_task_tx,
+    build_initialize_global_config_tx,
+    build_withdraw_tx,
+    close_program,
+    get_global_config_pda,
+    get_program,
+    get_user_account_pda,
+)
+from solders.pubkey import Pubkey
+
+USER = "64axKE8skJrTkFrQZUUtLi4zGPg8cMasssDBh21L9bFf"
+ADMIN = "7Y7c2jpw5BSbXzuEfRZwy9rQNSWyYzR2SanAX7ms4Ctb"
+CONFIG = "HFfs8k2M6VY5yDDEBMyzZhCyJxsMyM6AT5YF1SoJMkP2"
+ITERATIONS = 5_000
+
+
+def _serialize(ix):
+    return {
+        "program_id": str(ix.program_id),
+        "keys": [
+            {"pubkey": str(meta.pubkey), "is_signer": meta.is_signer, "is_writable": meta.is_writable}
+            for meta in ix.accounts
+        ],
+        "data": base64.b64encode(bytes(ix.data)).decode("utf-8"),
+    }
+
+
+async def anchorpy_initialize_global_config(admin_pubkey, unique_key, agent_fee_lamports):
+    program = await get_program()
+    ix = program.methods["initialize_global_config"].accounts({
+        "admin_account": Pubkey.from_string(admin_pubkey),
+        "global_config": await get_global_config_pda(admin_pubkey, unique_key),
+        "system_program": SYS_PROGRAM_ID,
+    }).args([unique_key, agent_fee_lamports]).instruction()
+    return _serialize(ix)
+
+
+async def anchorpy_deposit(global_config_pda, user_pubkey, admin_pubkey, num_tasks):
+    program = await get_program()
+    ix = program.methods["user_deposit"].accounts({
+        "global_config": Pubkey.from_string(global_config_pda),
+        "user_account": await get_user_account_pda(user_pubkey),
+        "admin_account": Pubkey.from_string(admin_pubkey),
+        "user": Pubkey.from_string(user_pubkey),
+        "system_program": SYS_PROGRAM_ID,
+    }).args([num_tasks]).instruction()
+    return _serialize(ix)
+
+
+async def anchorpy_execute_task(user_pubkey):
+    program = await get_program()
+    ix = program.methods["execute_task"].accounts({
+        "user_account": await get_user_account_pda(user_pubkey),
+        "user": Pubkey.from_string(user_pubkey),
+        "system_program": SYS_PROGRAM_ID,
+    }).instruction()
+    return _serialize(ix)
+
+
+async def anchorpy_withdraw(global_config_pda, admin_pubkey):
+    program = await get_program()
+    ix = program.methods["withdraw"].accounts({
+        "global_config": Pubkey.from_string(global_config_pda),
+        "admin_account": Pubkey.from_string(admin_pubkey),
+    }).instruction()
+    return _serialize(ix)
+
+
+async def check_parity():
+    cases = [
+        (anchorpy_initialize_global_config, build_initialize_global_config_tx, (ADMIN, "qwerty", 100)),
+        (anchorpy_deposit, build_deposit_tx, (CONFIG, USER, ADMIN, 5)),
+        (anchorpy_execute_task, build_execute_task_tx, (USER,)),
+        (anchorpy_withdraw, build_withdraw_tx, (CONFIG, ADMIN)),
+    ]
+    for reference, fast, args in cases:
+        expected, actual = await reference(*args), await fast(*args)
+        assert expected == actual, f"{fast.__name__} differs from anchorpy:\n{expected}\n{actual}"
+    print("parity: template output matches anchorpy for all instructions")
+
+
+async def requests_per_second(build, *args):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await build(*args)
+    return ITERATIONS / (time.perf_counter() - start)
+
+
+async def main():
+    await check_parity()
+    for name, before, after, args in [
+        ("/deposit", anchorpy_deposit, build_deposit_tx, (CONFIG, USER, ADMIN, 5)),
+        ("/execute-task", anchorpy_execute_task, build_execute_task_tx, (USER,)),
+    ]:
+        before_rps = await requests_per_second(before, *args)
+        after_rps = await requests_per_second(after, *args)
+        print(f"{name:<14} anchorpy {before_rps:>10,.0f} req/s   template {after_rps:>10,.0f} req/s   ({after_rps / before_rps:.1f}x)")
+    await close_program()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
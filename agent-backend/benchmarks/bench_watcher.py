@@ -0,0 +1,122 @@
+"""
+End-to-end watcher throughput, replayed offline.
+
+Starts a `benchmarks.replay.StandIn` server for a fixture (synthetic unless `--fixture`
+is given), points the watcher at it, runs `watch_wallet_and_tokens` for `--wallets`
+wallets through the shared hub and trade queue, replays `--count` notifications at
+`--rate` per second and reports trades/sec, per-stage p50/p99 latency and memory.
+
+The agent is the stand-in's /agent/analyze-trade (AGENT_IN_PROCESS=false) answering
+after `--llm-latency` seconds.
+
+    cd agent-backend && python -m benchmarks.bench_watcher --count 5000 --wallets 20
+"""
+import argparse
+import asyncio
+import math
+import os
+import resource
+import time
+import tracemalloc
+
+from solders.pubkey import Pubkey
+
+from benchmarks.replay import StandIn, load_fixture, synthetic_fixture
+
+
+def configure(standin: StandIn, args):
+    """Watcher settings are read at import time, so they're set before the first import."""
+    os.environ.update({
+        "RPC_URL": standin.http_url,
+        "WS_URL": standin.ws_url,
+        "JUPITER_API_URL": standin.http_url,
+        "AI_ANALYZE_ENDPOINT": f"{standin.http_url}/agent/analyze-trade",
+        "AGENT_IN_PROCESS": "false",
+        "TX_ENCODING": args.encoding,
+        "WATCHER_WORKERS": str(args.workers),
+        "WATCHER_QUEUE_SIZE": str(args.queue_size),
+        "FILTER_MAX_TRADES_PER_WALLET": "0",
+    })
+
+
+def report(elapsed, queue_stats, filtered, standin, rss_before_kb, heap_peak):
+    processed = queue_stats["processed"] + queue_stats["errors"] + filtered
+    print(f"\nnotifications sent     {standin.sent:>10,}")
+    print(f"notifications handled  {processed:>10,}   ({filtered} filtered before the queue, {queue_stats['errors']} errors, {queue_stats['dropped']} dropped)")
+    print(f"agent calls            {standin.analyses:>10,}")
+    print(f"elapsed                {elapsed:>10.2f} s")
+    print(f"throughput             {processed / elapsed:>10,.0f} notifications/s")
+    print(f"agent throughput       {standin.analyses / elapsed:>10,.1f} trades/s")
+
+    print(f"\n{'stage':<12}{'count':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in queue_stats["latency"].items():
+        print(f"{stage:<12}{stats['count']:>10,}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"\npeak RSS               {rss_kb / 1024:>10.1f} MiB   (+{(rss_kb - rss_before_kb) / 1024:.1f} MiB during the run)")
+    if heap_peak is not None:
+        print(f"peak traced heap       {heap_peak / 2 ** 20:>10.1f} MiB")
+
+
+async def run(args):
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(args.synthetic_size)
+    standin = await StandIn(fixture, rpc_latency=args.rpc_latency, llm_latency=args.llm_latency).start()
+    configure(standin, args)
+
+    from anchor.client import close_program
+    from hub import close_watcher_hub, get_watcher_hub
+    from watcher import close_http_session, close_trade_queue, get_trade_queue, log_classifier, watch_wallet_and_tokens
+
+    def filtered():
+        return log_classifier.counts["sol_transfer"] + log_classifier.counts["other"]
+
+    hub = get_watcher_hub()
+    # The fixture's own wallet first, so trade directions resolve for it
+    wallets = [fixture.get("wallet") or str(Pubkey.new_unique())]
+    wallets += [str(Pubkey.new_unique()) for _ in range(args.wallets - 1)]
+    watchers = [asyncio.create_task(watch_wallet_and_tokens(wallet, hub, trigger_limit=math.inf)) for wallet in wallets]
+    while len(standin.subscriptions) < len(wallets):
+        await asyncio.sleep(0.01)
+
+    queue = get_trade_queue()
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    await standin.replay(args.count, args.rate)
+    while queue.processed + queue.errors + queue.dropped + filtered() < standin.sent:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    heap_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    report(elapsed, queue.stats(), filtered(), standin, rss_before_kb, heap_peak)
+
+    for task in watchers:
+        task.cancel()
+    await asyncio.gather(*watchers, return_exceptions=True)
+    await close_watcher_hub()
+    await close_trade_queue()
+    await close_http_session()
+    await close_program()
+    await standin.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="recorded fixture (see benchmarks.replay); synthetic if omitted")
+    parser.add_argument("--synthetic-size", type=int, default=500, help="notifications in the synthetic fixture")
+    parser.add_argument("--count", type=int, default=2000, help="notifications to replay")
+    parser.add_argument("--rate", type=float, default=0, help="notifications per second, 0 for unthrottled")
+    parser.add_argument("--wallets", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--encoding", choices=("jsonParsed", "base64"), default="jsonParsed")
+    parser.add_argument("--rpc-latency", type=float, default=0.005, help="seconds added to each RPC call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per agent call")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Offline replay of recorded watcher traffic.
+
+A fixture is a JSON file holding captured `logsNotification` payloads plus the
+`getTransaction` results and Jupiter token / price answers they lead to:
+
+    {
+      "notifications": [{"signature": ..., "err": ..., "logs": [...]}, ...],
+      "transactions": {signature: {"jsonParsed": <result>, "base64": <result>}, ...},
+      "tokens": {mint: <tokens/v2 entry>, ...},
+      "prices": {mint: <price/v3 entry>, ...}
+    }
+
+`StandIn` serves a fixture as a local WebSocket + JSON-RPC + Jupiter + agent server,
+so the watcher can run unchanged against it (RPC_URL / WS_URL / JUPITER_API_URL /
+AI_ANALYZE_ENDPOINT pointed at the stand-in). Each replayed notification gets a fresh
+signature, so dedup never hides load.
+
+Record a fixture from a real wallet, or write a synthetic one:
+
+    cd agent-backend && python -m benchmarks.replay record <wallet> fixture.json --limit 200
+    cd agent-backend && python -m benchmarks.replay synthetic fixture.json --count 200
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import struct
+import time
+
+import aiohttp
+from aiohttp import web
+from solders.hash import Hash
+from solders.instruction import AccountMeta, Instruction
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+NOISE_PROGRAMS = (
+    "ComputeBudget111111111111111111111111111111",
+    "MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcHr",
+    "Vote111111111111111111111111111111111111111",
+)
+
+
+# ----------------------------
+# Fixtures
+# ----------------------------
+def load_fixture(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_fixture(fixture: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(fixture, f)
+
+
+def _token_balance(index, mint, owner, amount, decimals):
+    return {
+        "accountIndex": index,
+        "mint": mint,
+        "owner": owner,
+        "programId": TOKEN_PROGRAM,
+        "uiTokenAmount": {
+            "amount": str(amount),
+            "decimals": decimals,
+            "uiAmount": amount / 10 ** decimals,
+            "uiAmountString": str(amount / 10 ** decimals),
+        },
+    }
+
+
+def _synthetic_transfer(wallet: Keypair, mint: str, amount: int, decimals: int, logs: list[str]):
+    """Both encodings of one TransferChecked from `wallet`'s token account."""
+    source, destination = Pubkey.new_unique(), Pubkey.new_unique()
+    token = Pubkey.from_string(TOKEN_PROGRAM)
+    ix = Instruction(
+        token,
+        bytes([12]) + struct.pack("<QB", amount, decimals),
+        [
+            AccountMeta(source, False, True),
+            AccountMeta(Pubkey.from_string(mint), False, False),
+            AccountMeta(destination, False, True),
+            AccountMeta(wallet.pubkey(), True, False),
+        ],
+    )
+    message = MessageV0.try_compile(wallet.pubkey(), [ix], [], Hash.default())
+    tx = VersionedTransaction(message, [wallet])
+    keys = [str(key) for key in message.account_keys]
+    src, dst = keys.index(str(source)), keys.index(str(destination))
+    start = random.randrange(amount, 100 * amount)
+    meta = {
+        "err": None,
+        "status": {"Ok": None},
+        "fee": 5000,
+        "preBalances": [0] * len(keys),
+        "postBalances": [0] * len(keys),
+        "innerInstructions": [],
+        "logMessages": logs,
+        "preTokenBalances": [_token_balance(src, mint, keys[0], start, decimals), _token_balance(dst, mint, str(destination), 0, decimals)],
+        "postTokenBalances": [_token_balance(src, mint, keys[0], start - amount, decimals), _token_balance(dst, mint, str(destination), amount, decimals)],
+        "rewards": [],
+        "loadedAddresses": {"writable": [], "readonly": []},
+        "computeUnitsConsumed": 6200,
+    }
+    parsed_ix = {
+        "program": "spl-token",
+        "programId": TOKEN_PROGRAM,
+        "parsed": {
+            "type": "transferChecked",
+            "info": {
+                "source": str(source),
+                "mint": mint,
+                "destination": str(destination),
+                "authority": keys[0],
+                "tokenAmount": meta["postTokenBalances"][1]["uiTokenAmount"],
+            },
+        },
+        "stackHeight": None,
+    }
+    json_parsed = {
+        "slot": 1,
+        "blockTime": int(time.time()),
+        "version": 0,
+        "transaction": {
+            "signatures": [str(tx.signatures[0])],
+            "message": {
+                "accountKeys": [
+                    {"pubkey": key, "signer": i == 0, "writable": i in (src, dst), "source": "transaction"}
+                    for i, key in enumerate(keys)
+                ],
+                "recentBlockhash": str(Hash.default()),
+                "instructions": [parsed_ix],
+            },
+        },
+        "meta": meta,
+    }
+    raw = {
+        "slot": 1,
+        "blockTime": json_parsed["blockTime"],
+        "version": 0,
+        "transaction": [base64.b64encode(bytes(tx)).decode(), "base64"],
+        "meta": meta,
+    }
+    return {"jsonParsed": json_parsed, "base64": raw}
+
+
+def synthetic_fixture(count: int = 200, trade_ratio: float = 0.3, mints: int = 20, seed: int = 7):
+    """
+    A fixture shaped like a busy wallet: `trade_ratio` of the notifications are token
+    transfers, the rest compute-budget / memo / vote noise that never needs a fetch.
+    """
+    random.seed(seed)
+    wallet = Keypair()
+    mint_ids = [str(Pubkey.new_unique()) for _ in range(mints)]
+    fixture = {"wallet": str(wallet.pubkey()), "notifications": [], "transactions": {}, "tokens": {}, "prices": {}}
+
+    for mint in mint_ids:
+        fixture["tokens"][mint] = {"id": mint, "name": f"Token {mint[:4]}", "symbol": mint[:4], "totalSupply": 10 ** 9, "liquidity": 10 ** 6}
+        fixture["prices"][mint] = {"usdPrice": round(random.uniform(0.01, 50), 4)}
+
+    for i in range(count):
+        signature = str(Signature(os.urandom(64)))
+        if random.random() < trade_ratio:
+            logs = [
+                f"Program {TOKEN_PROGRAM} invoke [1]",
+                "Program log: Instruction: TransferChecked",
+                f"Program {TOKEN_PROGRAM} consumed 6200 of 200000 compute units",
+                f"Program {TOKEN_PROGRAM} success",
+            ]
+            decimals = random.choice((6, 9))
+            amount = int(10 ** random.uniform(decimals, decimals + 4))
+            fixture["transactions"][signature] = _synthetic_transfer(wallet, random.choice(mint_ids), amount, decimals, logs)
+        else:
+            program = random.choice(NOISE_PROGRAMS)
+            logs = [f"Program {program} invoke [1]", f"Program {program} success"]
+        fixture["notifications"].append({"signature": signature, "err": None, "logs": logs})
+    return fixture
+
+
+async def record_fixture(wallet: str, rpc_url: str, limit: int = 200, jupiter_url: str = "https://lite-api.jup.ag"):
+    """Captures the last `limit` transactions of `wallet` (both encodings) plus their token metadata and prices."""
+    fixture = {"wallet": wallet, "notifications": [], "transactions": {}, "tokens": {}, "prices": {}}
+    ids = itertools.count(1)
+
+    async with aiohttp.ClientSession() as session:
+        async def rpc(method, *params):
+            async with session.post(rpc_url, json={"jsonrpc": "2.0", "id": next(ids), "method": method, "params": list(params)}) as resp:
+                return (await resp.json()).get("result")
+
+        statuses = await rpc("getSignaturesForAddress", wallet, {"limit": limit})
+        mints = set()
+        for status in reversed(statuses or []):
+            signature = status["signature"]
+            encodings = {}
+            for encoding in ("jsonParsed", "base64"):
+                encodings[encoding] = await rpc("getTransaction", signature, {"encoding": encoding, "maxSupportedTransactionVersion": 0})
+            meta = (encodings["jsonParsed"] or {}).get("meta") or {}
+            for balance in (meta.get("preTokenBalances") or []) + (meta.get("postTokenBalances") or []):
+                mints.add(balance["mint"])
+            fixture["transactions"][signature] = encodings
+            fixture["notifications"].append({"signature": signature, "err": status.get("err"), "logs": meta.get("logMessages") or []})
+
+        for mint in mints:
+            async with session.get(f"{jupiter_url}/tokens/v2/search", params={"query": mint}) as resp:
+                fixture["tokens"][mint] = next((token for token in await resp.json() or [] if token.get("id") == mint), None)
+        mint_list = list(mints)
+        for i in range(0, len(mint_list), 50):
+            async with session.get(f"{jupiter_url}/price/v3", params={"ids": ",".join(mint_list[i:i + 50])}) as resp:
+                fixture["prices"].update(await resp.json() or {})
+    return fixture
+
+
+# ----------------------------
+# Stand-in server
+# ----------------------------
+class StandIn:
+    """
+    Local WebSocket (`logsSubscribe`), JSON-RPC (`getTransaction`, `getSignaturesForAddress`,
+    `getSlot`), Jupiter (tokens/v2, price/v3) and agent (`/agent/analyze-trade`) server
+    backed by one fixture. `replay(count, rate)` streams notifications round-robin over every
+    subscribed wallet at `rate` per second (0 = as fast as possible).
+    """
+
+    def __init__(self, fixture: dict, rpc_latency: float = 0.0, llm_latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.fixture = fixture
+        self.rpc_latency = rpc_latency
+        self.llm_latency = llm_latency
+        self.host = host
+        self.port = port
+        self.subscriptions: list[tuple[web.WebSocketResponse, int]] = []
+        self._signatures: dict[str, str] = {}  # replayed signature -> fixture signature
+        self._sub_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        self.sent = 0
+        self.analyses = 0
+
+    @property
+    def http_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws", self._websocket)
+        app.router.add_post("/", self._rpc)
+        app.router.add_get("/tokens/v2/search", self._tokens)
+        app.router.add_get("/price/v3", self._prices)
+        app.router.add_post("/agent/analyze-trade", self._analyze)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        async for message in ws:
+            req = json.loads(message.data)
+            if req["method"] == "logsSubscribe":
+                subscription_id = next(self._sub_ids)
+                self.subscriptions.append((ws, subscription_id))
+                await ws.send_str(json.dumps({"jsonrpc": "2.0", "result": subscription_id, "id": req["id"]}))
+            elif req["method"] == "logsUnsubscribe":
+                self.subscriptions = [(s, i) for s, i in self.subscriptions if i != req["params"][0]]
+                await ws.send_str(json.dumps({"jsonrpc": "2.0", "result": True, "id": req["id"]}))
+        self.subscriptions = [(s, i) for s, i in self.subscriptions if s is not ws]
+        return ws
+
+    async def replay(self, count: int, rate: float = 0.0):
+        """Sends `count` notifications (cycling through the fixture) at `rate` per second."""
+        notifications = itertools.cycle(self.fixture["notifications"])
+        start = time.perf_counter()
+        for i in range(count):
+            if not self.subscriptions:
+                break
+            ws, subscription_id = self.subscriptions[i % len(self.subscriptions)]
+            recorded = next(notifications)
+            signature = str(Signature(os.urandom(64)))
+            self._signatures[signature] = recorded["signature"]
+            await ws.send_str(json.dumps({
+                "jsonrpc": "2.0",
+                "method": "logsNotification",
+                "params": {
+                    "result": {
+                        "context": {"slot": i + 1},
+                        "value": {"signature": signature, "err": recorded["err"], "logs": recorded["logs"]},
+                    },
+                    "subscription": subscription_id,
+                },
+            }))
+            self.sent += 1
+            if rate > 0:
+                delay = start + (i + 1) / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 100 == 99:
+                await asyncio.sleep(0)
+
+    async def _rpc(self, request):
+        body = await request.json()
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+        method, params = body["method"], body.get("params") or []
+        if method == "getTransaction":
+            encoding = (params[1] if len(params) > 1 else {}).get("encoding", "json")
+            recorded = self.fixture["transactions"].get(self._signatures.get(params[0], params[0])) or {}
+            result = recorded.get(encoding)
+        elif method == "getSignaturesForAddress":
+            result = []
+        elif method == "getSlot":
+            result = self.sent
+        else:
+            return web.json_response({"jsonrpc": "2.0", "id": body["id"], "error": {"code": -32601, "message": f"{method} not replayed"}})
+        return web.json_response({"jsonrpc": "2.0", "id": body["id"], "result": result})
+
+    async def _tokens(self, request):
+        token = self.fixture["tokens"].get(request.query.get("query"))
+        return web.json_response([token] if token else [])
+
+    async def _prices(self, request):
+        ids = request.query.get("ids", "").split(",")
+        return web.json_response({mint: self.fixture["prices"][mint] for mint in ids if mint in self.fixture["prices"]})
+
+    async def _analyze(self, request):
+        await request.json()
+        if self.llm_latency:
+            await asyncio.sleep(self.llm_latency)
+        self.analyses += 1
+        decision = random.choice(("COPY", "PASS"))
+        return web.json_response({"response": {"decision": decision, "confidence": None, "latency_ms": 1000 * self.llm_latency, "model": "stand-in"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="capture a wallet's recent transactions")
+    record.add_argument("wallet")
+    record.add_argument("path")
+    record.add_argument("--limit", type=int, default=200)
+    record.add_argument("--rpc-url", default=os.getenv("RPC_URL", "https://api.devnet.solana.com"))
+    synthetic = commands.add_parser("synthetic", help="write a synthetic fixture")
+    synthetic.add_argument("path")
+    synthetic.add_argument("--count", type=int, default=200)
+    synthetic.add_argument("--trade-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        fixture = asyncio.run(record_fixture(args.wallet, args.rpc_url, args.limit))
+    else:
+        fixture = synthetic_fixture(args.count, args.trade_ratio)
+    save_fixture(fixture, args.path)
+    print(f"wrote {len(fixture['notifications'])} notifications, {len(fixture['transactions'])} transactions to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    In-process key/value cache with a per-entry TTL.
+
+    - `None` values are cached as negative entries with their own (usually shorter) TTL.
+    - `get_or_fetch` coalesces concurrent misses for the same key onto one in-flight fetch.
+    - Optional LRU bound via `max_size`.
+    - Entries can be snapshotted to / restored from a SQLite file so restarts come up warm.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float | None = None, max_size: int | None = None):
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: dict = {}                   # key -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        """Returns (found, value) without touching the counters."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key, default=None):
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def peek(self, key, default=None):
+        """Like `get`, but doesn't count as a hit or miss."""
+        found, value = self._lookup(key)
+        return value if found else default
+
+    def get_many(self, keys):
+        """Returns ({key: value} for cached keys, [missing keys])."""
+        found, missing = {}, []
+        for key in keys:
+            hit, value = self._lookup(key)
+            if hit:
+                self.hits += 1
+                found[key] = value
+            else:
+                self.misses += 1
+                missing.append(key)
+        return found, missing
+
+    def set(self, key, value, ttl: float | None = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for `key`, or awaits `fetch()` and caches its result.
+        Concurrent callers missing on the same key share a single `fetch()` call.
+        Exceptions are propagated to every waiter and are not cached. If the caller running
+        the fetch is cancelled, its waiters don't inherit that: one of them fetches again.
+        """
+        while True:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Re-raise only our own cancellation; a cancelled fetch is retried
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't log "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+    # ----------------------------
+    # SQLite snapshot
+    # ----------------------------
+    def save_snapshot(self, path: str):
+        """Writes all unexpired entries (JSON-encoded) to a SQLite file, replacing its contents."""
+        now = time.time()
+        rows = [
+            (json.dumps(key), json.dumps(value), expires_at)
+            for key, (expires_at, value) in self._entries.items()
+            if expires_at >= now
+        ]
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+                conn.execute("DELETE FROM entries")
+                conn.executemany("INSERT INTO entries VALUES (?, ?, ?)", rows)
+        finally:
+            conn.close()
+        return len(rows)
+
+    def load_snapshot(self, path: str):
+        """Restores unexpired entries from a SQLite snapshot. Missing files are ignored."""
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            return 0
+
+        loaded = 0
+        try:
+            rows = conn.execute(
+                "SELECT key, value, expires_at FROM entries WHERE expires_at >= ?", (time.time(),)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+
+        for key, value, expires_at in rows:
+            self.set(json.loads(key), json.loads(value), ttl=expires_at - time.time())
+            loaded += 1
+        return loaded
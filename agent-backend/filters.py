@@ -0,0 +1,182 @@
+import os
+import re
+import time
+from collections import deque
+
+
+def _env_set(name):
+    return {value.strip() for value in os.getenv(name, "").split(",") if value.strip()}
+
+# Rule thresholds
+FILTER_MIN_NOTIONAL_USD = float(os.getenv("FILTER_MIN_NOTIONAL_USD", 1))      # dust below this is skipped
+FILTER_MIN_LIQUIDITY_USD = float(os.getenv("FILTER_MIN_LIQUIDITY_USD", 1))    # known-illiquid tokens are skipped
+FILTER_ALLOW_MINTS = _env_set("FILTER_ALLOW_MINTS")                           # if set, only these mints pass
+FILTER_DENY_MINTS = _env_set("FILTER_DENY_MINTS")
+FILTER_MAX_TRADES_PER_WALLET = int(os.getenv("FILTER_MAX_TRADES_PER_WALLET", 10))  # per window, 0 disables
+FILTER_RATE_WINDOW = float(os.getenv("FILTER_RATE_WINDOW", 60))                    # seconds
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TradeFilter:
+    """
+    Cheap rule engine run between enrichment and the AI agent.
+
+    `select` evaluates every rule over all trades of a transaction at once and returns the
+    first trade that survives, so obvious PASS cases never cost an LLM call. Rejections are
+    counted per rule. Missing data (unknown price or liquidity) never rejects a trade.
+    """
+
+    def __init__(
+        self,
+        min_notional_usd: float = FILTER_MIN_NOTIONAL_USD,
+        min_liquidity_usd: float = FILTER_MIN_LIQUIDITY_USD,
+        allow_mints: set | None = None,
+        deny_mints: set | None = None,
+        max_trades_per_wallet: int = FILTER_MAX_TRADES_PER_WALLET,
+        rate_window: float = FILTER_RATE_WINDOW,
+        liquidity_lookup=None,
+    ):
+        self.min_notional_usd = min_notional_usd
+        self.min_liquidity_usd = min_liquidity_usd
+        self.allow_mints = FILTER_ALLOW_MINTS if allow_mints is None else allow_mints
+        self.deny_mints = FILTER_DENY_MINTS if deny_mints is None else deny_mints
+        self.max_trades_per_wallet = max_trades_per_wallet
+        self.rate_window = rate_window
+        self.liquidity_lookup = liquidity_lookup  # mint -> liquidity in USD, or None if unknown
+        self._wallet_trades: dict[str, deque] = {}
+        self.counts = {
+            "passed": 0,
+            "no_trade": 0,
+            "deny_list": 0,
+            "allow_list": 0,
+            "min_notional": 0,
+            "min_liquidity": 0,
+            "rate_limit": 0,
+        }
+
+    def _trade_rules(self, trade):
+        """Returns the name of the first rule rejecting `trade`, or None."""
+        mint = trade.get("mint")
+        if mint in self.deny_mints:
+            return "deny_list"
+        if self.allow_mints and mint not in self.allow_mints:
+            return "allow_list"
+
+        amount = _to_float(trade.get("amount"))
+        price = _to_float(trade.get("price_usd"))
+        if amount is not None and price is not None and amount * price < self.min_notional_usd:
+            return "min_notional"
+
+        if self.liquidity_lookup is not None and self.min_liquidity_usd > 0:
+            liquidity = _to_float(self.liquidity_lookup(mint))
+            if liquidity is not None and liquidity < self.min_liquidity_usd:
+                return "min_liquidity"
+        return None
+
+    def _rate_limited(self, wallet, now):
+        if self.max_trades_per_wallet <= 0:
+            return False
+        recent = self._wallet_trades.setdefault(wallet, deque())
+        while recent and recent[0] <= now - self.rate_window:
+            recent.popleft()
+        return len(recent) >= self.max_trades_per_wallet
+
+    def select(self, wallet: str, trades: list[dict]):
+        """
+        Returns (trade, None) for the first trade worth sending to the agent,
+        or (None, rule) naming the rule that short-circuited the transaction.
+        """
+        if not trades:
+            self.counts["no_trade"] += 1
+            return None, "no_trade"
+
+        rejections = [self._trade_rules(trade) for trade in trades]
+        for trade, rejection in zip(trades, rejections):
+            if rejection is None:
+                break
+        else:
+            rule = rejections[0]
+            self.counts[rule] += 1
+            return None, rule
+
+        now = time.monotonic()
+        if self._rate_limited(wallet, now):
+            self.counts["rate_limit"] += 1
+            return None, "rate_limit"
+
+        if self.max_trades_per_wallet > 0:
+            self._wallet_trades[wallet].append(now)
+        self.counts["passed"] += 1
+        return trade, None
+
+    def stats(self):
+        return dict(self.counts)
+
+
+# Program ids recognized in `Program <id> invoke [n]` log lines
+TOKEN_PROGRAMS = {
+    "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",  # SPL Token
+    "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb",  # Token-2022
+}
+SWAP_PROGRAMS = {
+    "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4",  # Jupiter v6
+    "JUP4Fb2cqiRUcaTHdrPC8h2gNsA2ETXiPDD33WcGuJB",  # Jupiter v4
+    "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8",  # Raydium AMM v4
+    "CAMMCzo5YL8w4VFF8KVHrK22GGUsp5VTaW7grrKgrWqK",  # Raydium CLMM
+    "CPMMoo8L3F4NbTegBCKVNunggL7H1ZpdTHKxQB5qKP1C",  # Raydium CPMM
+}
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+
+_INVOKE = re.compile(r"^Program (\w+) invoke \[\d+\]$", re.MULTILINE)
+_TOKEN_TRANSFER = re.compile(r"^Program log: Instruction: Transfer(?:Checked)?$", re.MULTILINE)
+
+# Kinds worth a transaction fetch; the enrichment only extracts token trades.
+# "unknown" is fetched and classified again from the transaction's own logs.
+TRADE_KINDS = ("swap", "token_transfer", "unknown")
+
+
+class LogClassifier:
+    """
+    Classifies a transaction from the logs already carried by its `logsNotification`,
+    before any RPC fetch. Kinds:
+      - "swap":           a Jupiter or Raydium program was invoked
+      - "token_transfer": a Token / Token-2022 Transfer or TransferChecked instruction ran
+      - "sol_transfer":   only the System program moved funds
+      - "other":          anything else (votes, memos, unrelated programs)
+      - "unknown":        no logs to go on (e.g. backfilled notifications)
+    """
+
+    def __init__(self, swap_programs: set | None = None, token_programs: set | None = None):
+        self.swap_programs = SWAP_PROGRAMS if swap_programs is None else swap_programs
+        self.token_programs = TOKEN_PROGRAMS if token_programs is None else token_programs
+        self.counts = {"swap": 0, "token_transfer": 0, "sol_transfer": 0, "other": 0, "unknown": 0}
+
+    def classify(self, logs: list[str] | None):
+        if not logs:
+            kind = "unknown"
+        else:
+            text = "\n".join(logs)
+            programs = set(_INVOKE.findall(text))
+            if not programs.isdisjoint(self.swap_programs):
+                kind = "swap"
+            elif not programs.isdisjoint(self.token_programs) and _TOKEN_TRANSFER.search(text):
+                kind = "token_transfer"
+            elif SYSTEM_PROGRAM in programs:
+                kind = "sol_transfer"
+            else:
+                kind = "other"
+        self.counts[kind] += 1
+        return kind
+
+    @staticmethod
+    def is_trade(kind: str):
+        return kind in TRADE_KINDS
+
+    def stats(self):
+        return dict(self.counts)
@@ -0,0 +1,416 @@
+import asyncio
+import inspect
+import itertools
+import os
+import random
+from typing import Callable
+from solana.rpc.websocket_api import connect, RpcTransactionLogsFilterMentions, SubscriptionError
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.rpc.config import RpcTransactionLogsConfig
+from solders.rpc.requests import LogsSubscribe, LogsUnsubscribe
+from solders.rpc.responses import (
+    SubscriptionResult,
+    LogsNotification,
+    LogsNotificationResult,
+    RpcLogsResponse,
+    RpcResponseContext,
+)
+from anchor.client import get_rpc_client
+from pipeline import pipeline_metrics
+
+WS_URL = os.getenv("WS_URL", "wss://api.devnet.solana.com")
+MAX_SUBSCRIPTIONS_PER_CONNECTION = 100  # wallets multiplexed over one socket before opening another
+SUBSCRIBE_TIMEOUT = 10                  # seconds to wait for the node to confirm a subscription
+RECONNECT_BASE_DELAY = 0.5              # seconds; doubled per failed attempt, with full jitter
+RECONNECT_MAX_DELAY = 30
+BACKFILL_PAGE_SIZE = 1000               # getSignaturesForAddress maximum
+BACKFILL_MAX_SIGNATURES = 5000          # per wallet and outage; older gaps are dropped
+
+
+def backoff_delay(attempt: int, base: float = RECONNECT_BASE_DELAY, cap: float = RECONNECT_MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HubConnection:
+    """
+    One pooled WebSocket connection carrying `logsSubscribe` subscriptions for many wallets.
+    A single reader task routes every notification by subscription id back to the hub.
+    """
+
+    def __init__(self, hub: "WatcherHub", ws_url: str):
+        self.hub = hub
+        self.ws_url = ws_url
+        self.websocket = None
+        self.wallet_to_sub: dict[str, int] = {}   # wallet -> subscription id
+        self.sub_to_wallet: dict[int, str] = {}   # subscription id -> wallet
+        self._pending: dict[int, tuple[str, asyncio.Future]] = {}  # request id -> (wallet, confirmation)
+        self.reserved: set[str] = set()  # wallets being subscribed, counted against capacity
+        self._opening: asyncio.Task | None = None
+        self._reader: asyncio.Task | None = None
+
+    @property
+    def wallets(self):
+        return set(self.wallet_to_sub) | self.reserved | {wallet for wallet, _ in self._pending.values()}
+
+    async def open(self):
+        """Connects once; concurrent callers share the same attempt."""
+        if self._opening is None:
+            self._opening = asyncio.create_task(self._connect())
+        await asyncio.shield(self._opening)
+
+    async def _connect(self):
+        self.websocket = await connect(self.ws_url)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self._opening is not None and not self._opening.done():
+            self._opening.cancel()
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def subscribe(self, wallet: str):
+        """Sends `logsSubscribe` for `wallet` and waits for the node to confirm it."""
+        request_id = self.websocket.increment_counter_and_get_id()
+        confirmation = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (wallet, confirmation)
+
+        request = LogsSubscribe(
+            RpcTransactionLogsFilterMentions(Pubkey.from_string(wallet)),
+            RpcTransactionLogsConfig(None),
+            request_id,
+        )
+        try:
+            await self.websocket.send_data(request)
+            return await asyncio.wait_for(confirmation, SUBSCRIBE_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def unsubscribe(self, wallet: str):
+        subscription_id = self.wallet_to_sub.pop(wallet, None)
+        if subscription_id is None:
+            return
+        self.sub_to_wallet.pop(subscription_id, None)
+        self.websocket.subscriptions.pop(subscription_id, None)
+        request = LogsUnsubscribe(subscription_id, self.websocket.increment_counter_and_get_id())
+        await self.websocket.send_data(request)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                try:
+                    messages = await self.websocket.recv()
+                except SubscriptionError as e:
+                    # The node rejected one request; only that subscribe fails, the socket is fine
+                    self._reject(e)
+                    continue
+                for msg in messages:
+                    if isinstance(msg, SubscriptionResult):
+                        # Map the subscription before reading on: its first notification may be in this batch
+                        pending = self._pending.get(msg.id)
+                        if pending is not None and not pending[1].done():
+                            wallet, confirmation = pending
+                            self.wallet_to_sub[wallet] = msg.result
+                            self.sub_to_wallet[msg.result] = wallet
+                            confirmation.set_result(msg.result)
+                        continue
+
+                    wallet = self.sub_to_wallet.get(getattr(msg, "subscription", None))
+                    if wallet is not None:
+                        with pipeline_metrics.timed("receive"):
+                            await self.hub.dispatch(wallet, msg)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Hub connection lost ({len(self.wallet_to_sub)} wallets): {e}")
+            for _, confirmation in self._pending.values():
+                if not confirmation.done():
+                    confirmation.set_exception(e)
+            self.hub.connection_lost(self)
+            # Nobody reads this socket any more; close it so the node stops pushing to it
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+    def _reject(self, error: SubscriptionError):
+        pending = self._pending.get(getattr(error.subscription, "id", None))
+        if pending is not None and not pending[1].done():
+            pending[1].set_exception(error)
+        else:
+            print(f"Hub request rejected: {error}")
+
+
+class WatcherHub:
+    """
+    Multiplexes `logsSubscribe` subscriptions for many target wallets over a few pooled
+    WebSocket connections.
+
+    Each wallet is subscribed once no matter how many users copy it; every notification is
+    routed by subscription id to all subscribers of that wallet. Subscriber callbacks run on
+    the connection's reader task, so they should only enqueue work.
+
+    When a connection drops, its wallets are re-subscribed with jittered exponential backoff.
+    The hub remembers the last slot / signature seen per wallet and, once a wallet is back,
+    replays the signatures it missed (from `getSignaturesForAddress`) to its subscribers as
+    log notifications with empty `logs`, oldest first.
+    """
+
+    def __init__(self, ws_url: str = WS_URL, max_subscriptions_per_connection: int = MAX_SUBSCRIPTIONS_PER_CONNECTION):
+        self.ws_url = ws_url
+        self.max_subscriptions_per_connection = max_subscriptions_per_connection
+        self.connections: list[HubConnection] = []
+        self._wallet_connection: dict[str, HubConnection] = {}
+        self._subscribers: dict[str, dict[int, tuple[Callable, Callable | None]]] = {}  # wallet -> {token: (callback, accept)}
+        self._tokens = itertools.count(1)
+        self._subscribing: dict[str, asyncio.Task] = {}  # wallet -> in-flight logsSubscribe
+        self.cursors: dict[str, tuple[int, str]] = {}  # wallet -> (last slot, last signature)
+        self._restore_tasks: set[asyncio.Task] = set()
+        self.reconnects = 0
+        self.backfilled = 0
+
+    async def subscribe(self, wallet: str, callback, accept: Callable | None = None):
+        """
+        Registers `callback(notification)` for logs mentioning `wallet`.
+        Returns a token to pass to `unsubscribe`.
+
+        If given, only notifications for which `accept(notification)` is true reach the callback.
+        Each distinct `accept` runs once per notification, however many subscribers share it.
+
+        Bookkeeping happens synchronously on the event loop; only the wallet's own subscribe
+        is awaited, so a slow node never blocks other wallets' subscribes or unsubscribes.
+        """
+        token = next(self._tokens)
+        self._subscribers.setdefault(wallet, {})[token] = (callback, accept)
+        try:
+            await self._ensure_subscribed(wallet)
+        except BaseException:
+            subscribers = self._subscribers.get(wallet, {})
+            subscribers.pop(token, None)
+            if not subscribers:
+                self._subscribers.pop(wallet, None)
+            raise
+        return token
+
+    async def unsubscribe(self, wallet: str, token: int):
+        """Removes one subscriber; the wallet's subscription is dropped with its last subscriber."""
+        subscribers = self._subscribers.get(wallet, {})
+        subscribers.pop(token, None)
+        if subscribers:
+            return
+
+        self._subscribers.pop(wallet, None)
+        self.cursors.pop(wallet, None)
+        # A subscribe still in flight drops the wallet itself once it sees no subscribers
+        connection = self._wallet_connection.pop(wallet, None)
+        if connection is None:
+            return
+        try:
+            await connection.unsubscribe(wallet)
+        except Exception as e:
+            print(f"Unsubscribe failed for {wallet}: {e}")
+        await self._close_if_empty(connection)
+
+    async def _ensure_subscribed(self, wallet: str):
+        """Subscribes `wallet` unless it already is; concurrent callers share one logsSubscribe."""
+        if wallet in self._wallet_connection:
+            return
+        task = self._subscribing.get(wallet)
+        if task is None or task.done():
+            task = asyncio.create_task(self._subscribe_wallet(wallet))
+            self._subscribing[wallet] = task
+            task.add_done_callback(lambda done: self._subscribing.pop(wallet, None) if self._subscribing.get(wallet) is done else None)
+        await asyncio.shield(task)
+
+    async def _subscribe_wallet(self, wallet: str):
+        connection = self._connection_with_capacity()
+        connection.reserved.add(wallet)
+        try:
+            await connection.open()
+            await connection.subscribe(wallet)
+        except BaseException:
+            connection.reserved.discard(wallet)
+            await self._close_if_empty(connection)
+            raise
+        connection.reserved.discard(wallet)
+
+        if wallet in self._subscribers:
+            self._wallet_connection[wallet] = connection
+            return
+        # Every subscriber left while the node was confirming
+        try:
+            await connection.unsubscribe(wallet)
+        except Exception as e:
+            print(f"Unsubscribe failed for {wallet}: {e}")
+        await self._close_if_empty(connection)
+
+    async def _close_if_empty(self, connection: HubConnection):
+        if connection.wallets or connection not in self.connections:
+            return
+        self.connections.remove(connection)
+        await connection.close()
+
+    async def dispatch(self, wallet: str, notification):
+        result = getattr(notification, "result", None)
+        signature = getattr(getattr(result, "value", None), "signature", None)
+        if signature is not None:
+            slot = result.context.slot
+            if slot >= self.cursors.get(wallet, (-1, None))[0]:
+                self.cursors[wallet] = (slot, str(signature))
+        verdicts = {}
+        for callback, accept in list(self._subscribers.get(wallet, {}).values()):
+            # A failing subscriber only loses this notification; it must not reach the
+            # reader, which would take the error for a lost connection
+            try:
+                if accept is not None:
+                    if accept not in verdicts:
+                        verdicts[accept] = accept(notification)
+                    if not verdicts[accept]:
+                        continue
+                result = callback(notification)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                verdicts.setdefault(accept, False)
+                print(f"Subscriber of {wallet} failed on a notification: {e}")
+
+    def connection_lost(self, connection: HubConnection):
+        if connection in self.connections:
+            self.connections.remove(connection)
+        lost = [wallet for wallet in connection.wallets if self._wallet_connection.get(wallet) is connection]
+        for wallet in lost:
+            del self._wallet_connection[wallet]
+        if lost:
+            task = asyncio.create_task(self._restore(lost))
+            self._restore_tasks.add(task)
+            task.add_done_callback(self._restore_tasks.discard)
+
+    async def _restore(self, wallets: list[str]):
+        """Re-subscribes `wallets` until every one still watched is back, then backfills the gap."""
+        attempt = 0
+        pending = list(wallets)
+        restored = []
+        while True:
+            pending = [wallet for wallet in pending if wallet in self._subscribers and wallet not in self._wallet_connection]
+            results = await asyncio.gather(*(self._ensure_subscribed(wallet) for wallet in pending), return_exceptions=True)
+            for wallet, result in zip(list(pending), results):
+                if isinstance(result, BaseException):
+                    print(f"Resubscribe failed for {wallet}: {result}")
+                    continue
+                pending.remove(wallet)
+                if wallet in self._wallet_connection:
+                    restored.append(wallet)
+            if not pending:
+                break
+            delay = backoff_delay(attempt)
+            attempt += 1
+            print(f"Reconnecting {len(pending)} wallets in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+        self.reconnects += 1
+        print(f"Restored {len(restored)} wallet subscriptions")
+        await asyncio.gather(*(self.backfill(wallet) for wallet in restored))
+
+    def seed_cursor(self, wallet: str, slot: int, signature: str):
+        """
+        Sets the wallet's cursor from persisted progress unless the hub already tracks a newer
+        one. Returns True if seeded, i.e. a `backfill` would replay something nobody has seen.
+        """
+        if wallet in self.cursors:
+            return False
+        self.cursors[wallet] = (slot, signature)
+        return True
+
+    async def backfill(self, wallet: str):
+        """Replays signatures for `wallet` newer than its cursor, oldest first, in RPC pages."""
+        cursor = self.cursors.get(wallet)
+        if cursor is None:
+            return 0
+        _, until = cursor
+
+        try:
+            client = await get_rpc_client()
+            missed = []
+            before = None
+            while len(missed) < BACKFILL_MAX_SIGNATURES:
+                resp = await client.get_signatures_for_address(
+                    Pubkey.from_string(wallet),
+                    before=before,
+                    until=Signature.from_string(until),
+                    limit=BACKFILL_PAGE_SIZE,
+                )
+                missed.extend(resp.value)
+                if len(resp.value) < BACKFILL_PAGE_SIZE:
+                    break
+                before = resp.value[-1].signature
+        except Exception as e:
+            print(f"Backfill failed for {wallet}: {e}")
+            return 0
+
+        missed = missed[:BACKFILL_MAX_SIGNATURES]
+        for status in reversed(missed):
+            notification = LogsNotification(
+                LogsNotificationResult(RpcLogsResponse(status.signature, status.err, []), RpcResponseContext(status.slot)),
+                self._subscription_id(wallet),
+            )
+            await self.dispatch(wallet, notification)
+        if missed:
+            print(f"Backfilled {len(missed)} transactions for {wallet}")
+        self.backfilled += len(missed)
+        return len(missed)
+
+    def _subscription_id(self, wallet: str):
+        connection = self._wallet_connection.get(wallet)
+        return connection.wallet_to_sub.get(wallet, 0) if connection is not None else 0
+
+    def _connection_with_capacity(self):
+        """A pooled connection with room for one more wallet; a new one is opened by its first subscriber."""
+        for connection in self.connections:
+            if len(connection.wallets) < self.max_subscriptions_per_connection:
+                return connection
+        connection = HubConnection(self, self.ws_url)
+        self.connections.append(connection)
+        return connection
+
+    def stats(self):
+        return {
+            "connections": len(self.connections),
+            "wallets": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "restoring": len(self._restore_tasks),
+            "reconnects": self.reconnects,
+            "backfilled": self.backfilled,
+        }
+
+    async def close(self):
+        for task in self._restore_tasks:
+            task.cancel()
+        await asyncio.gather(*self._restore_tasks, return_exceptions=True)
+        for task in list(self._subscribing.values()):
+            task.cancel()
+        connections, self.connections = self.connections, []
+        self._wallet_connection.clear()
+        self._subscribers.clear()
+        self.cursors.clear()
+        for connection in connections:
+            await connection.close()
+
+
+_hub: WatcherHub | None = None
+
+def get_watcher_hub() -> WatcherHub:
+    """Returns the process-wide hub shared by every watcher."""
+    global _hub
+    if _hub is None:
+        _hub = WatcherHub()
+    return _hub
+
+async def close_watcher_hub():
+    """Closes all hub connections. Called from the FastAPI lifespan on shutdown."""
+    global _hub
+    if _hub is not None:
+        await _hub.close()
+    _hub = None
@@ -0,0 +1,115 @@
+from agents.langgraph_agent import get_decision_cache_stats
+from anchor.client import get_pda_cache_stats
+from hub import get_watcher_hub
+from pipeline import StageMetrics, pipeline_metrics
+from watcher import get_dedup_stats, get_trade_queue, log_classifier, trade_counts, trade_filter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "copytrade"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict | None):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsWriter:
+    """Builds a Prometheus text-format (0.0.4) exposition, one metric family at a time."""
+
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self.lines: list[str] = []
+
+    def _family(self, name: str, kind: str, help_text: str):
+        name = f"{self.prefix}_{name}"
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        return name
+
+    def counter(self, name: str, help_text: str, samples):
+        """`samples` is a number or an iterable of (labels, value)."""
+        name = self._family(f"{name}_total", "counter", help_text)
+        self._samples(name, samples)
+
+    def gauge(self, name: str, help_text: str, samples):
+        name = self._family(name, "gauge", help_text)
+        self._samples(name, samples)
+
+    def _samples(self, name, samples):
+        if isinstance(samples, (int, float)):
+            samples = [(None, samples)]
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {value}")
+
+    def histograms(self, name: str, help_text: str, metrics: StageMetrics, label: str = "stage"):
+        """One histogram family with a series per stage of `metrics`."""
+        name = self._family(name, "histogram", help_text)
+        bounds = [*(repr(float(bound)) for bound in metrics.buckets), "+Inf"]
+        for stage, (cumulative, total, count) in metrics.histograms().items():
+            for bound, value in zip(bounds, cumulative):
+                self.lines.append(f"{name}_bucket{_labels({label: stage, 'le': bound})} {value}")
+            self.lines.append(f"{name}_sum{_labels({label: stage})} {total}")
+            self.lines.append(f"{name}_count{_labels({label: stage})} {count}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics():
+    """Collects watcher, hub, queue, filter and cache state into one Prometheus exposition."""
+    writer = MetricsWriter()
+    writer.histograms(
+        "stage_latency_seconds",
+        "Latency of each pipeline stage (receive, queue_wait, fetch, price, metadata, enrich, analyze, execute, handle).",
+        pipeline_metrics,
+    )
+
+    queue_stats = get_trade_queue().stats()
+    hub_stats = get_watcher_hub().stats()
+    writer.counter("trades_seen", "Log notifications that reached the watcher pipeline.", trade_counts["seen"])
+    writer.counter(
+        "trades_filtered",
+        "Notifications dropped before the agent, by rule.",
+        [({"rule": f"log:{kind}"}, log_classifier.counts[kind]) for kind in ("sol_transfer", "other")]
+        + [({"rule": rule}, count) for rule, count in trade_filter.stats().items() if rule != "passed"],
+    )
+    writer.counter("trades_copied", "Trades the agent decided to copy.", trade_counts["copied"])
+    writer.counter("trades_passed", "Trades the agent decided to pass on.", trade_counts["passed"])
+    writer.counter("errors", "Notifications whose processing raised.", queue_stats["errors"])
+    writer.counter(
+        "queue_items",
+        "Trade queue items by outcome.",
+        [({"outcome": outcome}, queue_stats[outcome]) for outcome in ("enqueued", "processed", "dropped", "coalesced")],
+    )
+    dedup = get_dedup_stats()
+    writer.counter(
+        "duplicates_suppressed",
+        "Duplicate signatures suppressed, by stage.",
+        [({"stage": "analysis"}, dedup["duplicate_analyses_suppressed"]), ({"stage": "fetch"}, dedup["duplicate_fetches_suppressed"])],
+    )
+    writer.counter("hub_reconnects", "Hub connection restores.", hub_stats["reconnects"])
+    writer.counter("hub_backfilled", "Transactions replayed after a reconnect.", hub_stats["backfilled"])
+    decision_cache = get_decision_cache_stats()
+    writer.counter(
+        "decision_cache_lookups",
+        "Agent decision cache lookups, by result.",
+        [({"result": result}, decision_cache[result]) for result in ("hits", "misses", "coalesced")],
+    )
+    pda_cache = get_pda_cache_stats()
+    writer.counter(
+        "pda_cache_lookups",
+        "Memoized PDA derivations, by result.",
+        [({"result": "hits"}, pda_cache["hits"]), ({"result": "misses"}, pda_cache["misses"])],
+    )
+
+    writer.gauge("active_watchers", "Watch jobs currently subscribed through the hub.", hub_stats["subscribers"])
+    writer.gauge("watched_wallets", "Distinct wallets subscribed through the hub.", hub_stats["wallets"])
+    writer.gauge("hub_connections", "Open hub WebSocket connections.", hub_stats["connections"])
+    writer.gauge("queue_depth", "Items waiting in the trade queue.", queue_stats["depth"])
+    writer.gauge("queue_workers", "Trade queue worker tasks.", queue_stats["workers"])
+    return writer.text()
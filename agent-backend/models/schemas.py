@@ -1,4 +1,12 @@
 from construct import Struct, Int64ul, Int32ul, Int8ul, Flag, Bytes
+from enum import Enum
+from pydantic import BaseModel
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for `decode_user_accounts_array`
+    np = None
 
 GlobalConfigLayout = Struct(
     "discriminator" / Bytes(8),
@@ -15,4 +23,53 @@ UserAccountLayout = Struct(
     "tasks_used" / Int8ul,
     "tasks_remaining" / Int8ul,
     "has_rated" / Flag,
-)
\ No newline at end of file
+)
+
+# Precompiled equivalents of the layouts above
+USER_ACCOUNT_STRUCT = struct.Struct("<8s32sQBB?")       # fixed 51-byte record
+CONFIG_HEADER_STRUCT = struct.Struct("<8s32sI")         # discriminator, admin, unique_key_len
+CONFIG_FEE_STRUCT = struct.Struct("<Q")                 # agent_fee_lamports, after unique_key
+
+USER_ACCOUNT_DTYPE = None if np is None else np.dtype([
+    ("discriminator", "V8"),
+    ("user", "V32"),
+    ("total_paid", "<u8"),
+    ("tasks_used", "u1"),
+    ("tasks_remaining", "u1"),
+    ("has_rated", "?"),
+])
+
+def unpack_user_account(data):
+    """(discriminator, user, total_paid, tasks_used, tasks_remaining, has_rated) from a UserAccount buffer."""
+    return USER_ACCOUNT_STRUCT.unpack_from(data)
+
+def unpack_global_config(data):
+    """(discriminator, admin, unique_key, agent_fee_lamports) from a GlobalConfig buffer."""
+    view = memoryview(data)
+    discriminator, admin, key_len = CONFIG_HEADER_STRUCT.unpack_from(view)
+    key_end = CONFIG_HEADER_STRUCT.size + key_len
+    if len(view) < key_end + CONFIG_FEE_STRUCT.size:
+        raise struct.error(f"GlobalConfig buffer too short for unique_key of length {key_len}")
+    (agent_fee_lamports,) = CONFIG_FEE_STRUCT.unpack_from(view, key_end)
+    return discriminator, admin, bytes(view[CONFIG_HEADER_STRUCT.size:key_end]), agent_fee_lamports
+
+def decode_user_accounts_array(buffers):
+    """Decodes many UserAccount buffers into a NumPy structured array (one row per account)."""
+    if np is None:
+        raise RuntimeError("NumPy is required for decode_user_accounts_array")
+    size = USER_ACCOUNT_STRUCT.size
+    joined = b"".join(bytes(memoryview(buffer)[:size]) for buffer in buffers)
+    if len(joined) != size * len(buffers):
+        raise struct.error("UserAccount buffer shorter than the fixed layout")
+    return np.frombuffer(joined, dtype=USER_ACCOUNT_DTYPE)
+
+class Decision(str, Enum):
+    COPY = "COPY"
+    PASS = "PASS"
+
+class TradeDecision(BaseModel):
+    """Compact result of a trade analysis."""
+    decision: Decision
+    confidence: float | None = None
+    latency_ms: float
+    model: str
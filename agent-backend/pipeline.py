@@ -0,0 +1,249 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "coalesce")
+
+# Per-trade prints (transactions, logs, trade context) are costly under load; errors always print
+VERBOSE_LOGS = os.getenv("VERBOSE_LOGS", "true").lower() in ("1", "true", "yes")
+
+def log(*args):
+    """`print` for hot-path detail, silenced when VERBOSE_LOGS is off."""
+    if VERBOSE_LOGS:
+        print(*args)
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageMetrics:
+    """
+    Latency per pipeline stage: count, mean, p50, p99, max over a sliding window,
+    plus cumulative histogram buckets and totals for Prometheus.
+    """
+
+    def __init__(self, window: int = 1024, buckets: tuple = LATENCY_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self._sums: dict[str, float] = {}
+        self._bucket_counts: dict[str, list[int]] = {}  # per bucket, plus a trailing +Inf slot
+
+    def observe(self, stage: str, seconds: float):
+        self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+        self._counts[stage] = self._counts.get(stage, 0) + 1
+        self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+        bucket_counts = self._bucket_counts.get(stage)
+        if bucket_counts is None:
+            bucket_counts = self._bucket_counts[stage] = [0] * (len(self.buckets) + 1)
+        bucket_counts[bisect_left(self.buckets, seconds)] += 1
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def histograms(self):
+        """{stage: (cumulative counts per bucket incl. +Inf, sum, count)}"""
+        histograms = {}
+        for stage, bucket_counts in self._bucket_counts.items():
+            cumulative, total = [], 0
+            for count in bucket_counts:
+                total += count
+                cumulative.append(total)
+            histograms[stage] = (cumulative, self._sums[stage], self._counts[stage])
+        return histograms
+
+    def snapshot(self):
+        stats = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            stats[stage] = {
+                "count": self._counts[stage],
+                "mean_ms": 1000 * sum(ordered) / len(ordered),
+                "p50_ms": 1000 * ordered[len(ordered) // 2],
+                "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                "max_ms": 1000 * ordered[-1],
+            }
+        return stats
+
+
+# Shared by the hub, the trade queue and every watcher stage
+pipeline_metrics = StageMetrics()
+
+
+class WorkQueue:
+    """
+    Bounded producer/consumer queue drained by a pool of worker tasks.
+
+    Producers call `put`; when the queue is full the overflow policy decides what happens:
+      - "block":       wait for space (backpressure onto the producer)
+      - "drop-oldest": evict the oldest queued item to make room
+      - "coalesce":    skip items whose `key(item)` is already queued, then block if still full
+
+    `on_drop(item)`, if given, is called for every item evicted by "drop-oldest".
+    """
+
+    def __init__(self, handler, maxsize: int = 1000, workers: int = 4, overflow: str = "block", key=None, metrics: StageMetrics | None = None, on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.overflow = overflow
+        self.key = key
+        self.on_drop = on_drop
+        self.metrics = metrics or StageMetrics()
+        self._queue: asyncio.Queue | None = None
+        self._queued_keys: dict = {}  # key -> number of queued items with that key
+        self._tasks: list[asyncio.Task] = []
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item):
+        self.start()
+        key = self.key(item) if self.key is not None else None
+
+        if self.overflow == "coalesce" and key is not None and key in self._queued_keys:
+            self.coalesced += 1
+            return
+
+        if self.overflow == "drop-oldest":
+            while self._queue.full():
+                try:
+                    old_item, old_key, _ = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                self._queue.task_done()
+                self._forget(old_key)
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(old_item)
+            self._queue.put_nowait((item, key, time.perf_counter()))
+        else:
+            await self._queue.put((item, key, time.perf_counter()))
+
+        if key is not None:
+            self._queued_keys[key] = self._queued_keys.get(key, 0) + 1
+        self.enqueued += 1
+
+    def _forget(self, key):
+        if key is None:
+            return
+        remaining = self._queued_keys.get(key, 0) - 1
+        if remaining > 0:
+            self._queued_keys[key] = remaining
+        else:
+            self._queued_keys.pop(key, None)
+
+    async def _worker(self):
+        while True:
+            item, key, enqueued_at = await self._queue.get()
+            self._forget(key)
+            self.metrics.observe("queue_wait", time.perf_counter() - enqueued_at)
+            start = time.perf_counter()
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                # Stop only if this worker is being cancelled; a handler's stray cancellation is just a failed item
+                if asyncio.current_task().cancelling():
+                    raise
+                self.errors += 1
+                print("Worker error: handler was cancelled")
+            except Exception as e:
+                self.errors += 1
+                print(f"Worker error: {e}")
+            finally:
+                self.metrics.observe("handle", time.perf_counter() - start)
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": len(self._tasks),
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "latency": self.metrics.snapshot(),
+        }
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within `window` seconds (up to `max_size`) and passes them to
+    `flush(batch)` as one list of (item, future); a full batch is flushed without waiting.
+    `flush` resolves each future; any still pending when it raises get its exception.
+    Items submitted with a `key` already in the open batch share that item's future, so
+    callers of keyed submits should await it through `asyncio.shield`.
+    """
+
+    def __init__(self, flush, window: float, max_size: int):
+        self.flush = flush
+        self.window = window
+        self.max_size = max_size
+        self._batch: dict = {}  # key -> (item, future)
+        self._flush_task: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, item, key=None) -> asyncio.Future:
+        if key is not None and key in self._batch:
+            return self._batch[key][1]
+        future = asyncio.get_running_loop().create_future()
+        self._batch[key if key is not None else object()] = (item, future)
+
+        if len(self._batch) >= self.max_size:
+            # Enough for a full batch, don't wait for the window
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                self._flush_task = None
+            self._spawn(self._flush())
+        elif self._flush_task is None:
+            self._flush_task = self._spawn(self._flush_later())
+        return future
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self):
+        batch, self._batch = list(self._batch.values()), {}
+        try:
+            await self.flush(batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
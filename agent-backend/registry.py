@@ -0,0 +1,219 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+# ----------------------------
+# Persistent registry of /execute-task watch jobs
+# ----------------------------
+WATCH_REGISTRY_PATH = os.getenv("WATCH_REGISTRY_PATH", "watch_registry.sqlite")
+REGISTRY_BUSY_TIMEOUT = 10  # seconds a writer waits for another process's lock
+
+ACTIVE = "active"
+DONE = "done"
+FAILED = "failed"  # gave up after too many failed runs
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watch_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target_wallet TEXT NOT NULL,
+    user_pubkey TEXT NOT NULL,
+    trigger_count INTEGER NOT NULL DEFAULT 0,
+    trigger_limit INTEGER NOT NULL,
+    last_signature TEXT,
+    last_slot INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'active',
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    shard_key INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,  -- while unowned: not claimable before this time (retry backoff)
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS watch_jobs_status_lease ON watch_jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS watch_jobs_user ON watch_jobs (user_pubkey);
+"""
+
+# Progress only moves forward, and only the lease holder may write it
+_RECORD_PROGRESS = """
+UPDATE watch_jobs SET
+    trigger_count = MAX(trigger_count, ?),
+    last_signature = CASE WHEN ? >= last_slot THEN ? ELSE last_signature END,
+    last_slot = MAX(last_slot, ?),
+    updated_at = ?
+WHERE id = ? AND lease_owner = ?
+"""
+
+
+def shard_key(wallet: str):
+    """Stable across processes and restarts (unlike `hash()`), so a wallet always lands on the same shard."""
+    return int.from_bytes(hashlib.sha256(wallet.encode()).digest()[:4], "big")
+
+
+class WatchRegistry:
+    """
+    SQLite store of watch jobs: target wallet, user, trigger count and last signature.
+    Jobs are spread over shards by wallet and run by whichever worker holds their lease;
+    WAL mode lets the worker processes of one host share the file.
+    """
+
+    def __init__(self, path: str = WATCH_REGISTRY_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=REGISTRY_BUSY_TIMEOUT, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        # Registries created before retries were capped lack the failure columns
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(watch_jobs)")}
+        if "failures" not in columns:
+            self.conn.execute("ALTER TABLE watch_jobs ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+        if "last_error" not in columns:
+            self.conn.execute("ALTER TABLE watch_jobs ADD COLUMN last_error TEXT")
+
+    def close(self):
+        self.conn.close()
+
+    def create(self, target_wallet: str, user_pubkey: str, trigger_limit: int):
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO watch_jobs (target_wallet, user_pubkey, trigger_limit, shard_key, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (target_wallet, user_pubkey, trigger_limit, shard_key(target_wallet), now, now),
+        )
+        return self.get(cursor.lastrowid)
+
+    # ----------------------------
+    # Leases
+    # ----------------------------
+    def claim(self, owner: str, shard: int, shards: int, lease: float, limit: int):
+        """
+        Leases up to `limit` active jobs of `shard` that are unleased or whose lease expired
+        (their worker died). BEGIN IMMEDIATE takes the write lock up front, so two workers
+        never claim the same job.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT * FROM watch_jobs WHERE status = ? AND shard_key % ? = ?"
+                " AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY id LIMIT ?",
+                (ACTIVE, shards, shard, now, limit),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE watch_jobs SET lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                [(owner, now + lease, now, row["id"]) for row in rows],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [{**dict(row), "lease_owner": owner, "lease_expires": now + lease} for row in rows]
+
+    def renew(self, owner: str, job_ids: list[int], lease: float):
+        """Extends the leases `owner` still holds; returns the ids it has lost."""
+        if not job_ids:
+            return []
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "UPDATE watch_jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                [(now + lease, job_id, owner, ACTIVE) for job_id in job_ids],
+            )
+            held = {
+                row["id"] for row in self.conn.execute(
+                    f"SELECT id FROM watch_jobs WHERE lease_owner = ? AND status = ? AND id IN ({','.join('?' * len(job_ids))})",
+                    (owner, ACTIVE, *job_ids),
+                )
+            }
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [job_id for job_id in job_ids if job_id not in held]
+
+    def release(self, owner: str, job_ids: list[int]):
+        """Gives leases back so another worker can pick the jobs up right away (e.g. on shutdown)."""
+        self.conn.executemany(
+            "UPDATE watch_jobs SET lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+            [(time.time(), job_id, owner) for job_id in job_ids],
+        )
+
+    # ----------------------------
+    # Progress
+    # ----------------------------
+    def record_progress(self, owner: str, job_id: int, trigger_count: int, last_signature: str | None, last_slot: int):
+        now = time.time()
+        self.conn.execute(_RECORD_PROGRESS, (trigger_count, last_slot, last_signature, last_slot, now, job_id, owner))
+
+    def fail(self, owner: str, job_id: int, error: str, max_failures: int, retry_delay: float):
+        """
+        Records a failed run: the job becomes claimable again after `retry_delay` seconds, or is
+        marked failed once it has failed `max_failures` times. Returns the new status.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT failures FROM watch_jobs WHERE id = ? AND lease_owner = ?", (job_id, owner)).fetchone()
+            status = None
+            if row is not None:
+                failures = row["failures"] + 1
+                status = FAILED if failures >= max_failures else ACTIVE
+                self.conn.execute(
+                    "UPDATE watch_jobs SET failures = ?, last_error = ?, status = ?, lease_owner = NULL, lease_expires = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (failures, error[:500], status, now + retry_delay if status == ACTIVE else None, now, job_id),
+                )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def complete(self, owner: str, job_id: int):
+        self.conn.execute(
+            "UPDATE watch_jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+            (DONE, time.time(), job_id, owner),
+        )
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def get(self, job_id: int):
+        row = self.conn.execute("SELECT * FROM watch_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, status: str | None = None, user_pubkey: str | None = None, limit: int = 100, offset: int = 0):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if user_pubkey is not None:
+            clauses.append("user_pubkey = ?")
+            params.append(user_pubkey)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(f"SELECT * FROM watch_jobs {where} ORDER BY id DESC LIMIT ? OFFSET ?", (*params, limit, offset))
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        rows = self.conn.execute("""
+            SELECT status, COUNT(*) AS jobs, COALESCE(SUM(lease_owner IS NOT NULL AND lease_expires >= ?), 0) AS leased
+            FROM watch_jobs GROUP BY status
+        """, (time.time(),))
+        return {row["status"]: {"jobs": row["jobs"], "leased": row["leased"]} for row in rows}
+
+
+_registry: WatchRegistry | None = None
+
+def get_watch_registry() -> WatchRegistry:
+    global _registry
+    if _registry is None:
+        _registry = WatchRegistry()
+    return _registry
+
+def close_watch_registry():
+    global _registry
+    if _registry is not None:
+        _registry.close()
+    _registry = None
@@ -0,0 +1,269 @@
+from anchor.client import init_program, close_program
+from hub import WatcherHub, get_watcher_hub, close_watcher_hub
+from registry import FAILED, WatchRegistry, get_watch_registry, close_watch_registry
+from watcher import (
+    WalletWatch,
+    watch_wallet_and_tokens,
+    close_http_session,
+    close_trade_queue,
+    load_token_metadata_snapshot,
+    save_token_metadata_snapshot
+)
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+# ----------------------------
+# Sharded, leased scheduler for registry watch jobs
+# ----------------------------
+WATCH_SHARDS = int(os.getenv("WATCH_SHARDS", "1"))
+WATCH_SHARD = int(os.getenv("WATCH_SHARD", "0"))
+WATCH_LEASE_SECONDS = float(os.getenv("WATCH_LEASE_SECONDS", "30"))
+WATCH_SCHEDULER_INTERVAL = float(os.getenv("WATCH_SCHEDULER_INTERVAL", "10"))  # must stay well under the lease
+WATCH_MAX_JOBS_PER_WORKER = int(os.getenv("WATCH_MAX_JOBS_PER_WORKER", "1000"))
+WATCH_MAX_FAILURES = int(os.getenv("WATCH_MAX_FAILURES", "5"))  # failed runs before a job is marked failed
+WATCH_RETRY_BASE_DELAY = 5    # seconds before retrying a failed job; doubled per failure
+WATCH_RETRY_MAX_DELAY = 300
+# Run shard WATCH_SHARD inside the API process; disable when dedicated workers (`python scheduler.py`) run the jobs
+WATCH_SCHEDULER_IN_PROCESS = os.getenv("WATCH_SCHEDULER_IN_PROCESS", "true").lower() in ("1", "true", "yes")
+RESTART_DELAY = 1  # seconds before the supervisor restarts a dead worker process
+
+
+class WatchScheduler:
+    """
+    Runs the registry's watch jobs for one shard. Every tick it checkpoints the running
+    watches, renews their leases (stopping any it lost), settles finished ones and claims
+    more, so a job whose worker died is picked up by another once its lease expires.
+    """
+
+    def __init__(
+        self,
+        registry: WatchRegistry,
+        shard: int = WATCH_SHARD,
+        shards: int = WATCH_SHARDS,
+        worker_id: str | None = None,
+        hub: WatcherHub | None = None,
+        lease: float = WATCH_LEASE_SECONDS,
+        interval: float = WATCH_SCHEDULER_INTERVAL,
+        max_jobs: int = WATCH_MAX_JOBS_PER_WORKER,
+    ):
+        if not 0 <= shard < shards:
+            raise ValueError(f"Shard {shard} is out of range for {shards} shards")
+        self.registry = registry
+        self.shard = shard
+        self.shards = shards
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{shard}"
+        self.hub = hub
+        self.lease = lease
+        self.interval = interval
+        self.max_jobs = max_jobs
+        self.running: dict[int, tuple[WalletWatch, asyncio.Task]] = {}
+        self.claimed = 0
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def wake(self):
+        """Claims new jobs now instead of at the next tick (e.g. right after /execute-task)."""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Watch scheduler tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def tick(self):
+        for job_id, (watch, task) in list(self.running.items()):
+            self._checkpoint(job_id, watch)
+            if task.done():
+                self._settle(job_id, watch, task)
+
+        for job_id in self.registry.renew(self.worker_id, list(self.running), self.lease):
+            print(f"Lost the lease on watch job {job_id}, stopping it")
+            self.running.pop(job_id)[1].cancel()
+            self.lost += 1
+
+        capacity = self.max_jobs - len(self.running)
+        if capacity > 0:
+            for job in self.registry.claim(self.worker_id, self.shard, self.shards, self.lease, capacity):
+                self._start(job)
+
+    def _start(self, job: dict):
+        job_id = job["id"]
+        watch = WalletWatch(
+            job["target_wallet"],
+            job["trigger_limit"],
+            ai_trigger_count=job["trigger_count"],
+            last_signature=job["last_signature"],
+            last_slot=job["last_slot"],
+            # Persist every trigger immediately, so a crash never re-spends one
+            on_trigger=lambda watch: self._checkpoint(job_id, watch),
+        )
+        task = asyncio.create_task(watch_wallet_and_tokens(job["target_wallet"], self.hub, watch=watch))
+        self.running[job_id] = (watch, task)
+        self.claimed += 1
+        print(f"Watch job {job_id} for {job['target_wallet']} started ({job['trigger_count']}/{job['trigger_limit']} triggers)")
+
+    def _checkpoint(self, job_id: int, watch: WalletWatch):
+        try:
+            self.registry.record_progress(self.worker_id, job_id, watch.ai_trigger_count, watch.last_signature, watch.last_slot)
+        except Exception as e:
+            print(f"Could not checkpoint watch job {job_id}: {e}")
+
+    def _settle(self, job_id: int, watch: WalletWatch, task: asyncio.Task):
+        """
+        Completes a finished job. One that raised is retried with backoff until it has failed
+        WATCH_MAX_FAILURES times; one that was stopped (shutdown, lost lease) is released.
+        """
+        del self.running[job_id]
+        if watch.done.is_set():
+            self.registry.complete(self.worker_id, job_id)
+            self.completed += 1
+            print(f"Watch job {job_id} completed")
+            return
+        if task.cancelled() or task.exception() is None:
+            self.registry.release(self.worker_id, [job_id])
+            return
+
+        error = task.exception()
+        job = self.registry.get(job_id)
+        delay = min(WATCH_RETRY_MAX_DELAY, WATCH_RETRY_BASE_DELAY * 2 ** (job["failures"] if job else 0))
+        status = self.registry.fail(self.worker_id, job_id, f"{error}", WATCH_MAX_FAILURES, delay)
+        if status == FAILED:
+            self.failed += 1
+            print(f"Watch job {job_id} failed permanently: {error}")
+        else:
+            print(f"Watch job {job_id} failed, retrying in {delay:.0f}s: {error}")
+
+    async def close(self):
+        """Stops the watches, saves their progress and hands the unfinished jobs back."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        tasks = [task for _, task in self.running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job_id, (watch, task) in list(self.running.items()):
+            self._checkpoint(job_id, watch)
+            self._settle(job_id, watch, task)
+
+    def stats(self):
+        return {
+            "worker_id": self.worker_id,
+            "shard": self.shard,
+            "shards": self.shards,
+            "running": len(self.running),
+            "claimed": self.claimed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "lost_leases": self.lost,
+        }
+
+
+_scheduler: WatchScheduler | None = None
+
+def get_watch_scheduler() -> WatchScheduler | None:
+    return _scheduler
+
+def start_watch_scheduler(**kwargs) -> WatchScheduler:
+    """Starts the process-wide scheduler. Called from the FastAPI lifespan or a worker process."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = WatchScheduler(get_watch_registry(), hub=get_watcher_hub(), **kwargs).start()
+    return _scheduler
+
+async def close_watch_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.close()
+    _scheduler = None
+
+
+# ----------------------------
+# Dedicated worker processes
+# ----------------------------
+async def run_worker(shard: int, shards: int):
+    """One worker process: runs a shard's jobs until SIGINT/SIGTERM, then releases them."""
+    await init_program()
+    load_token_metadata_snapshot()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    start_watch_scheduler(shard=shard, shards=shards)
+    print(f"Watch worker {os.getpid()} running shard {shard}/{shards}")
+    await stop.wait()
+
+    await close_watch_scheduler()
+    close_watch_registry()
+    save_token_metadata_snapshot()
+    await close_watcher_hub()
+    await close_trade_queue()
+    await close_http_session()
+    await close_program()
+
+def _worker_main(shard: int, shards: int):
+    load_dotenv()
+    asyncio.run(run_worker(shard, shards))
+
+def supervise(shards: int):
+    """Runs one worker process per shard and restarts any that die."""
+    workers: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while not stopping:
+        for shard in range(shards):
+            process = workers.get(shard)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"Watch worker for shard {shard} exited with {process.exitcode}, restarting")
+            workers[shard] = multiprocessing.Process(target=_worker_main, args=(shard, shards), name=f"watch-worker-{shard}")
+            workers[shard].start()
+        time.sleep(RESTART_DELAY)
+
+    for process in workers.values():
+        process.terminate()
+    for process in workers.values():
+        process.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs registry watch jobs outside the API process.")
+    parser.add_argument("--shards", type=int, default=WATCH_SHARDS, help="total number of shards")
+    parser.add_argument("--shard", type=int, help="run only this shard in the current process; otherwise one process per shard")
+    args = parser.parse_args()
+    if args.shard is not None:
+        _worker_main(args.shard, args.shards)
+    else:
+        supervise(args.shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,92 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
+from solders.pubkey import Pubkey
 from anchor.client import (
     build_deposit_tx, 
     build_execute_task_tx, 
     build_initialize_global_config_tx, 
-    get_user_account_data,
-    get_config_account_data
+    get_user_account_pdas,
+    get_user_accounts_data,
+    get_config_accounts_data,
+    get_pda_cache_stats,
+    init_program,
+    close_program
 )
-from agents.langgraph_agent import compiled_graph
-from watcher import watch_wallet_and_tokens
+from agents.langgraph_agent import (
+    analyze_trade_decision,
+    stream_trade_decision,
+    get_decision_cache_stats
+)
+from watcher import (
+    AI_TRIGGER_LIMIT,
+    close_http_session,
+    close_trade_queue,
+    get_trade_queue,
+    get_dedup_stats,
+    trade_filter,
+    log_classifier,
+    load_token_metadata_snapshot,
+    save_token_metadata_snapshot
+)
+from anchor.indexer import (
+    ACCOUNT_INDEX_ENABLED,
+    get_account_index,
+    close_account_index,
+    snapshot_program_accounts,
+    watch_program_accounts
+)
+from anchor.account_cache import (
+    get_cached_user_account_data,
+    get_cached_config_account_data,
+    get_account_cache,
+    close_account_cache
+)
+from hub import get_watcher_hub, close_watcher_hub
+from registry import get_watch_registry, close_watch_registry
+from scheduler import (
+    WATCH_SCHEDULER_IN_PROCESS,
+    get_watch_scheduler,
+    start_watch_scheduler,
+    close_watch_scheduler
+)
+from metrics import render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import uvicorn
 import os
 
 load_dotenv()
 
-app = FastAPI(title="Solana Agent Terminal Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared Anchor program / RPC client once
+    await init_program()
+    load_token_metadata_snapshot()
+    # Keep the local account index current from programSubscribe
+    index_task = asyncio.create_task(watch_program_accounts(get_account_index())) if ACCOUNT_INDEX_ENABLED else None
+    # Resume persisted watch jobs of this process's shard
+    if WATCH_SCHEDULER_IN_PROCESS:
+        start_watch_scheduler()
+    yield
+    if index_task is not None:
+        index_task.cancel()
+        await asyncio.gather(index_task, return_exceptions=True)
+    # Checkpoint running watches and release their leases for the next deploy / another worker
+    await close_watch_scheduler()
+    close_watch_registry()
+    save_token_metadata_snapshot()
+    # Release pooled watcher and RPC connections on shutdown
+    await close_watcher_hub()
+    await close_account_cache()
+    await close_trade_queue()
+    await close_http_session()
+    await close_program()
+    close_account_index()
+
+app = FastAPI(title="Solana Agent Terminal Backend", lifespan=lifespan)
 
 origins = [
     os.getenv("FRONTEND_URL") or "http://localhost:5173"
@@ -40,6 +110,9 @@ class AdminInitializeConfigRequest(BaseModel):
 class AdminGetConfigRequest(BaseModel):
     config_pda_pubkey: str
 
+class AdminGetConfigBatchRequest(BaseModel):
+    config_pda_pubkeys: list[str]
+
 class DepositRequest(BaseModel):
     global_config_pda: str
     user_pubkey: str
@@ -53,8 +126,15 @@ class ExecuteTaskRequest(BaseModel):
 class UserDetailsRequest(BaseModel):
     user_pubkey: str
 
+class UserDetailsBatchRequest(BaseModel):
+    user_pubkeys: list[str]
+
+class UserPdasRequest(BaseModel):
+    user_pubkeys: list[str]
+
 class TradeAnalysisRequest(BaseModel):
     trade_data: dict
+    bypass_cache: bool = False
 
 # Endpoints
 
@@ -79,13 +159,26 @@ async def get_config(request: AdminGetConfigRequest):
     """
 
     try:
-        config_data = await get_config_account_data(request.config_pda_pubkey)
+        config_data = await get_cached_config_account_data(request.config_pda_pubkey)
         if not config_data:
             raise HTTPException(status_code=404, detail="Config account not found")
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"{e}")
 
     return {"response": config_data}
+
+@app.post("/get-config/batch")
+async def get_config_batch(request: AdminGetConfigBatchRequest):
+    """
+    Fetches many `GlobalConfig` accounts with batched RPC reads.
+    """
+    try:
+        configs, invalid = await get_config_accounts_data(request.config_pda_pubkeys)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
+    not_found = [pda for pda, config in configs.items() if config is None and pda not in invalid]
+    return {"response": configs, "not_found": not_found, "invalid": invalid}
     
 
 @app.post("/deposit")
@@ -97,20 +190,28 @@ async def deposit(request: DepositRequest):
     return {"response": {"transaction": serialized_tx}}
 
 @app.post("/execute-task")
-async def execute_task(request: ExecuteTaskRequest, background_tasks: BackgroundTasks):
+async def execute_task(request: ExecuteTaskRequest):
     """
     Starts the copy-trade watcher.
-    The watcher listens for trades from `target_wallet` and triggers AI agent analysis.
+    Registers a persistent watch job; a scheduler worker listens for trades from
+    `target_wallet` and triggers AI agent analysis, resuming the job after restarts.
     """
+    try:
+        Pubkey.from_string(request.target_wallet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid target_wallet: {e}")
     ix = await build_execute_task_tx(request.user_pubkey)
-    background_tasks.add_task(watch_wallet_and_tokens, request.target_wallet)
-    return {"ix": ix}
+    job = get_watch_registry().create(request.target_wallet, request.user_pubkey, AI_TRIGGER_LIMIT)
+    scheduler = get_watch_scheduler()
+    if scheduler is not None:
+        scheduler.wake()
+    return {"ix": ix, "job_id": job["id"]}
 
 @app.post("/user-details")
 async def user_details(request: UserDetailsRequest):
     
     try:
-        user_data = await get_user_account_data(request.user_pubkey)
+        user_data = await get_cached_user_account_data(request.user_pubkey)
         if not user_data:
             raise HTTPException(status_code=404, detail="User account not found")
     except Exception as e:
@@ -118,16 +219,167 @@ async def user_details(request: UserDetailsRequest):
 
     return {"response": user_data}
 
+@app.get("/account-cache")
+async def account_cache_stats():
+    """
+    Hit/miss and subscription statistics of the account-state cache behind /user-details and /get-config.
+    """
+    return {"response": get_account_cache().stats()}
+
+@app.get("/pda-cache")
+async def pda_cache_stats():
+    """
+    Hit/miss statistics of the memoized PDA derivation.
+    """
+    return {"response": get_pda_cache_stats()}
+
+@app.post("/user-details/batch")
+async def user_details_batch(request: UserDetailsBatchRequest):
+    """
+    Fetches many `UserAccount` accounts with batched RPC reads.
+    """
+    try:
+        users, invalid = await get_user_accounts_data(request.user_pubkeys)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
+    not_found = [user for user, data in users.items() if data is None and user not in invalid]
+    return {"response": users, "not_found": not_found, "invalid": invalid}
+
+@app.post("/user-pdas")
+async def user_pdas(request: UserPdasRequest):
+    """
+    Resolves the `UserAccount` PDA for many users in one call.
+    """
+    try:
+        pdas = await get_user_account_pdas(request.user_pubkeys)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
+    return {"response": {user: str(pda) for user, pda in zip(request.user_pubkeys, pdas)}}
+
+# ACCOUNT INDEX
+
+@app.post("/index/refresh")
+async def index_refresh():
+    """
+    Re-snapshots every program-owned `UserAccount` and `GlobalConfig` into the local index.
+    """
+    try:
+        counts = await snapshot_program_accounts(get_account_index())
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"{e}")
+    return {"response": counts}
+
+@app.get("/index/summary")
+async def index_summary():
+    """
+    Aggregates over the local index: users, total paid, tasks used / remaining, configs.
+    """
+    return {"response": get_account_index().summary()}
+
+@app.get("/index/users")
+async def index_users(min_tasks_remaining: int = 1, limit: int = 100, offset: int = 0):
+    """
+    Users with at least `min_tasks_remaining` tasks left, most remaining first.
+    """
+    return {"response": get_account_index().users_with_tasks_remaining(min_tasks_remaining, limit, offset)}
+
+@app.get("/index/users/{user_pubkey}")
+async def index_user(user_pubkey: str):
+    user = get_account_index().user(user_pubkey)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User account not indexed")
+    return {"response": user}
+
+@app.get("/index/configs")
+async def index_configs(admin: str | None = None):
+    """
+    Indexed `GlobalConfig` accounts, optionally for one admin, with per-admin fee totals.
+    """
+    index = get_account_index()
+    return {"response": index.configs(admin), "by_admin": index.fees_by_admin()}
+
 # COPY TRADE
 
 @app.post("/agent/analyze-trade")
-def analyze_trade(request: TradeAnalysisRequest):
+async def analyze_trade(request: TradeAnalysisRequest):
     """
     INTERNAL endpoint: Called by watcher when a trade is detected.
-    Runs AI agent workflow (LangGraph / CrewAI) and returns decision.
+    Runs AI agent workflow (LangGraph / CrewAI) and returns a compact `TradeDecision`.
+    """
+    try:
+        decision = await analyze_trade_decision(request.trade_data, use_cache=not request.bypass_cache)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Trade analysis timed out")
+    return {"response": decision}
+
+@app.post("/agent/analyze-trade/stream")
+async def analyze_trade_stream(request: TradeAnalysisRequest):
+    """
+    Server-Sent Events variant of /agent/analyze-trade.
+    Emits a `decision` event as soon as the model outputs COPY or PASS, then a `done` event,
+    or an `error` event if the analysis times out.
+    """
+    async def events():
+        try:
+            async for event, decision in stream_trade_decision(request.trade_data, use_cache=not request.bypass_cache):
+                yield f"event: {event}\ndata: {decision.model_dump_json()}\n\n"
+        except asyncio.TimeoutError:
+            yield 'event: error\ndata: {"detail": "Trade analysis timed out"}\n\n'
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/watchers")
+async def watchers():
+    """
+    Connection and subscription counts of the shared watcher hub, plus
+    backpressure metrics of the trade processing queue.
+    """
+    return {
+        "response": {
+            "hub": get_watcher_hub().stats(),
+            "queue": get_trade_queue().stats(),
+            "dedup": get_dedup_stats(),
+            "classifier": log_classifier.stats(),
+            "filter": trade_filter.stats(),
+        }
+    }
+
+@app.get("/watch-jobs")
+async def watch_jobs(status: str | None = None, user_pubkey: str | None = None, limit: int = 100, offset: int = 0):
+    """
+    Persistent watch jobs, newest first, with per-status counts and this process's scheduler state.
+    """
+    registry = get_watch_registry()
+    scheduler = get_watch_scheduler()
+    return {
+        "response": registry.list_jobs(status, user_pubkey, limit, offset),
+        "by_status": registry.stats(),
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+    }
+
+@app.get("/watch-jobs/{job_id}")
+async def watch_job(job_id: int):
+    job = get_watch_registry().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Watch job not found")
+    return {"response": job}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus exposition: per-stage latency histograms, trade outcome counters,
+    and watcher / queue gauges.
+    """
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/agent/decision-cache")
+async def decision_cache_stats():
+    """
+    Hit/miss statistics of the trade decision cache.
     """
-    response = compiled_graph.invoke({"messages": [{"role": "user", "content": f"Analyze this Solana trade:\n{request.trade_data}"}]})
-    return {"response": response}
+    return {"response": get_decision_cache_stats()}
 
 # TRADE EXECUTION
 
@@ -0,0 +1,29 @@
+"""Parity of the precompiled `struct` account decoders with the `construct` layouts."""
+import random
+import struct
+
+import pytest
+from construct import ConstructError
+
+from benchmarks.bench_decoders import check_parity, random_global_config, random_user_account
+from models.schemas import GlobalConfigLayout, UserAccountLayout, unpack_global_config, unpack_user_account
+
+
+def test_struct_decoders_match_construct_layouts():
+    random.seed(0)
+    users = [random_user_account() for _ in range(2_000)]
+    configs = [random_global_config() for _ in range(2_000)]
+    check_parity(users, configs)
+
+
+@pytest.mark.parametrize("make, layout, unpack", [
+    (random_user_account, UserAccountLayout, unpack_user_account),
+    (random_global_config, GlobalConfigLayout, unpack_global_config),
+])
+def test_every_truncation_is_rejected(make, layout, unpack):
+    random.seed(1)
+    for data in (make() for _ in range(20)):
+        for length in range(len(data)):
+            for decode in (layout.parse, unpack):
+                with pytest.raises((ConstructError, struct.error)):
+                    decode(data[:length])
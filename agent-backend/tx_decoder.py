@@ -0,0 +1,126 @@
+import struct
+import based58
+
+# ----------------------------
+# Local decoding of base64-encoded transactions (solders objects)
+# ----------------------------
+TOKEN_PROGRAM_NAMES = {
+    "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA": "spl-token",
+    "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb": "spl-token-2022",
+}
+
+# SPL Token instruction tag -> (jsonParsed type, token account position, mint position or None, has decimals)
+TOKEN_INSTRUCTION_LAYOUTS = {
+    3: ("transfer", 0, None, False),
+    7: ("mintTo", 1, 0, False),
+    8: ("burn", 0, 1, False),
+    12: ("transferChecked", 0, 1, True),
+    14: ("mintToChecked", 1, 0, True),
+    15: ("burnChecked", 0, 1, True),
+}
+
+_AMOUNT = struct.Struct("<Q")
+_AMOUNT_DECIMALS = struct.Struct("<QB")
+
+
+def account_keys(tx):
+    """Static account keys followed by the ones loaded from address lookup tables, as strings."""
+    transaction = tx.transaction
+    keys = [str(key) for key in transaction.transaction.message.account_keys]
+    loaded = transaction.meta.loaded_addresses if transaction.meta else None
+    if loaded is not None:
+        keys.extend(str(key) for key in loaded.writable)
+        keys.extend(str(key) for key in loaded.readonly)
+    return keys
+
+
+def iter_instructions(tx):
+    """
+    Yields (program_id_index, account indexes, data bytes) for every instruction in execution
+    order: each top-level instruction followed by the inner (CPI) instructions it invoked.
+    """
+    transaction = tx.transaction
+    meta = transaction.meta
+    inner_by_index = {inner.index: inner.instructions for inner in (meta.inner_instructions or [])} if meta else {}
+
+    for index, ix in enumerate(transaction.transaction.message.instructions):
+        yield ix.program_id_index, bytes(ix.accounts), bytes(ix.data)
+        for inner in inner_by_index.get(index, []):
+            yield inner.program_id_index, bytes(inner.accounts), based58.b58decode(inner.data.encode())
+
+
+def token_accounts(meta):
+    """Maps account index -> (mint, decimals) from the pre/post token-balance arrays."""
+    accounts = {}
+    for balance in (meta.pre_token_balances or []) + (meta.post_token_balances or []):
+        accounts[balance.account_index] = (str(balance.mint), balance.ui_token_amount.decimals)
+    return accounts
+
+
+def token_balance_deltas(meta):
+    """
+    Net change per (owner, mint), in UI units, over one pass of the pre/post token balances.
+    Raw integer amounts are summed before scaling, so no float error accumulates.
+    """
+    raw = {}
+    decimals = {}
+    for sign, balances in ((-1, meta.pre_token_balances or []), (1, meta.post_token_balances or [])):
+        for balance in balances:
+            key = (str(balance.owner) if balance.owner else None, str(balance.mint))
+            raw[key] = raw.get(key, 0) + sign * int(balance.ui_token_amount.amount)
+            decimals[key] = balance.ui_token_amount.decimals
+    return {key: amount / 10 ** decimals[key] for key, amount in raw.items()}
+
+
+def decode_token_instructions(tx):
+    """
+    Token program instructions (top-level and inner) with their mint and UI amount:
+    [{"program", "type", "mint", "amount"}]. Plain `transfer` carries no mint, so it is
+    resolved from the token-balance entry of its source account. The amount is None when
+    the mint's decimals can't be resolved.
+    """
+    meta = tx.transaction.meta
+    if meta is None:
+        return []
+    keys = account_keys(tx)
+    mints = token_accounts(meta)
+    decimals_by_mint = {mint: decimals for mint, decimals in mints.values()}
+
+    instructions = []
+    for program_index, accounts, data in iter_instructions(tx):
+        program = TOKEN_PROGRAM_NAMES.get(keys[program_index])
+        if program is None or not data:
+            continue
+        layout = TOKEN_INSTRUCTION_LAYOUTS.get(data[0])
+        if layout is None:
+            continue
+        ix_type, account_position, mint_position, has_decimals = layout
+        if len(accounts) <= max(account_position, mint_position or 0):
+            continue
+
+        token_mint, decimals = mints.get(accounts[account_position], (None, None))
+        mint = keys[accounts[mint_position]] if mint_position is not None else token_mint
+        if has_decimals and len(data) >= 1 + _AMOUNT_DECIMALS.size:
+            amount, decimals = _AMOUNT_DECIMALS.unpack_from(data, 1)
+        elif len(data) >= 1 + _AMOUNT.size:
+            (amount,) = _AMOUNT.unpack_from(data, 1)
+        else:
+            continue
+        if mint is None:
+            continue
+        if decimals is None:
+            decimals = decimals_by_mint.get(mint)
+
+        instructions.append({
+            "program": program,
+            "type": ix_type,
+            "mint": mint,
+            # Raw base units would inflate the notional by 10**decimals
+            "amount": amount / 10 ** decimals if decimals is not None else None,
+        })
+    return instructions
+
+
+def log_messages(tx):
+    meta = tx.transaction.meta
+    return list(meta.log_messages or []) if meta else []
@@ -1,37 +1,109 @@
 import asyncio
 import aiohttp # aiohttp is very efficient for persistent sessions.
-from solana.rpc.async_api import AsyncClient
 from solana.rpc.websocket_api import connect, RpcTransactionLogsFilterMentions
 from solders.pubkey import Pubkey
-from websockets.exceptions import ConnectionClosedError
+from anchor.client import get_rpc_client
+from cache import TTLCache
+from filters import TradeFilter, LogClassifier
+from hub import WS_URL, WatcherHub, get_watcher_hub, backoff_delay
+from pipeline import VERBOSE_LOGS, MicroBatcher, WorkQueue, log, pipeline_metrics
+from tx_decoder import decode_token_instructions, token_balance_deltas, log_messages
 import base64
+import heapq
 import json
+import math
+import os
 
-AI_ANALYZE_ENDPOINT = "http://localhost:8000/agent/analyze-trade"
-TRADE_EXEC_ENDPOINT = "http://localhost:8000/trade-execute"
+AI_ANALYZE_ENDPOINT = os.getenv("AI_ANALYZE_ENDPOINT", "http://localhost:8000/agent/analyze-trade")
+TRADE_EXEC_ENDPOINT = os.getenv("TRADE_EXEC_ENDPOINT", "http://localhost:8000/trade-execute")
+JUPITER_API_URL = os.getenv("JUPITER_API_URL", "https://lite-api.jup.ag")
+# Run the agent graph in this process instead of calling our own server over loopback HTTP
+AGENT_IN_PROCESS = os.getenv("AGENT_IN_PROCESS", "true").lower() in ("1", "true", "yes")
+
+# Shared HTTP client settings
+HTTP_LIMIT = 100                # total pooled connections
+HTTP_LIMIT_PER_HOST = 20        # pooled connections per host (Jupiter, backend)
+HTTP_KEEPALIVE_TIMEOUT = 30     # seconds an idle connection stays open
+HTTP_DNS_CACHE_TTL = 300        # seconds a resolved host is cached
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5, sock_read=20)
+
+_http_session: aiohttp.ClientSession | None = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Returns the watcher's long-lived pooled aiohttp session, creating it on first use.
+    All HTTP helpers share it so connections (and TLS handshakes) are reused across trades.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=HTTP_TIMEOUT)
+    return _http_session
+
+async def close_http_session():
+    """Closes the shared session. Called from the FastAPI lifespan on shutdown."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
 async def sent_trade_to_agent(trade_data: dict):
     """
-    Calls backend /agent/analyze-trade endpoint for AI analysis.
+    Calls backend /agent/analyze-trade endpoint for AI analysis,
+    or runs the agent graph directly when AGENT_IN_PROCESS is set.
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.post(AI_ANALYZE_ENDPOINT, json={
-            "trade_data": trade_data
-        }) as response:
-            output = await response.json()
-            print("RESPONSE:", output)
-            return await response.json()
+    if AGENT_IN_PROCESS:
+        from agents.langgraph_agent import analyze_trade_decision
+        decision = await analyze_trade_decision(trade_data)
+        output = {"response": decision.model_dump(mode="json")}
+        log("RESPONSE:", output)
+        return output
+
+    session = get_http_session()
+    async with session.post(AI_ANALYZE_ENDPOINT, json={
+        "trade_data": trade_data
+    }) as response:
+        output = await response.json()
+        log("RESPONSE:", output)
+        return output
         
 async def execute_trade():
-    async with aiohttp.ClientSession() as session:
+    session = get_http_session()
+    with pipeline_metrics.timed("execute"):
         async with session.get(TRADE_EXEC_ENDPOINT) as response:
             return await response.json()
         
-async def get_token_metadata(mint):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"https://lite-api.jup.ag/tokens/v2/search?query=usdc") as resp:
-            tokens = await resp.json()
-            token_details = tokens[0]
+UNKNOWN_TOKEN = {
+    "id": "UNKNOWN", 
+    "name": "UNKNOWN", 
+    "symbol": "UNKNOWN", 
+    "totalSupply": 0, 
+    "liquidity": 0
+}
+
+# Token metadata barely changes; unknown mints are re-checked more often
+TOKEN_METADATA_TTL = 6 * 60 * 60
+TOKEN_METADATA_NEGATIVE_TTL = 10 * 60
+TOKEN_METADATA_SNAPSHOT = os.getenv("TOKEN_METADATA_SNAPSHOT")  # optional SQLite file path
+
+token_metadata_cache = TTLCache(ttl=TOKEN_METADATA_TTL, negative_ttl=TOKEN_METADATA_NEGATIVE_TTL, max_size=50_000)
+
+async def fetch_token_metadata(mint):
+    """Looks up `mint` on the Jupiter tokens API. Returns None if Jupiter doesn't know the mint."""
+    session = get_http_session()
+    async with session.get(f"{JUPITER_API_URL}/tokens/v2/search", params={"query": mint}) as resp:
+        resp.raise_for_status()
+        tokens = await resp.json()
+
+    if not isinstance(tokens, list):
+        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status, message=f"unexpected token search response: {tokens!r:.200}")
+    for token_details in tokens:
+        if token_details.get("id") == mint:
             return {
                 "id": token_details.get("id", "UNKNOWN"), 
                 "name": token_details.get("name", "UNKNOWN"), 
@@ -39,170 +111,494 @@ async def get_token_metadata(mint):
                 "totalSupply": token_details.get("totalSupply", 0), 
                 "liquidity": token_details.get("liquidity", 0)
             }
-    return {
-        "id": "UNKNOWN", 
-        "name": "UNKNOWN", 
-        "symbol": "UNKNOWN", 
-        "totalSupply": 0, 
-        "liquidity": 0
-    }
+    return None
 
-async def get_token_price(symbol):
-    async with aiohttp.ClientSession() as session:
-        url = f"https://lite-api.jup.ag/price/v3?ids=EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
-        async with session.get(url) as resp:
-            data = await resp.json()
-            return data.get("EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v", {})
+async def get_token_metadata(mint):
+    """
+    Cached token metadata for `mint`. Concurrent lookups of the same mint share one request.
+    """
+    try:
+        token_meta = await token_metadata_cache.get_or_fetch(mint, lambda: fetch_token_metadata(mint))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Token metadata lookup failed for {mint}: {e}")
+        token_meta = None
+    return token_meta or dict(UNKNOWN_TOKEN)
+
+def load_token_metadata_snapshot():
+    """Warms the metadata cache from TOKEN_METADATA_SNAPSHOT, if configured."""
+    if TOKEN_METADATA_SNAPSHOT:
+        loaded = token_metadata_cache.load_snapshot(TOKEN_METADATA_SNAPSHOT)
+        print(f"Loaded {loaded} cached token metadata entries")
+
+def save_token_metadata_snapshot():
+    """Persists the metadata cache to TOKEN_METADATA_SNAPSHOT, if configured."""
+    if TOKEN_METADATA_SNAPSHOT:
+        token_metadata_cache.save_snapshot(TOKEN_METADATA_SNAPSHOT)
+
+# Prices move fast: cache briefly and batch lookups into as few price/v3 requests as possible
+TOKEN_PRICE_TTL = 5
+PRICE_BATCH_WINDOW = 0.02   # seconds to collect mints (across transactions) before one request
+PRICE_BATCH_MAX_IDS = 50    # max mints per price/v3 request
+
+token_price_cache = TTLCache(ttl=TOKEN_PRICE_TTL, max_size=10_000)
+
+async def fetch_token_prices(mints: list[str]):
+    """Fetches prices for `mints` with one Jupiter price/v3 request. Unpriced mints map to None."""
+    session = get_http_session()
+    async with session.get(f"{JUPITER_API_URL}/price/v3", params={"ids": ",".join(mints)}) as resp:
+        data = await resp.json()
+    return {mint: (data or {}).get(mint) for mint in mints}
+
+async def _flush_prices(batch):
+    """MicroBatcher flush: one price/v3 request for every mint collected in the window."""
+    prices = await fetch_token_prices([mint for mint, _ in batch])
+    for mint, future in batch:
+        if not future.done():
+            future.set_result(prices.get(mint))
+
+# Coalesces price lookups arriving within the window into requests of at most PRICE_BATCH_MAX_IDS mints
+price_batcher = MicroBatcher(_flush_prices, PRICE_BATCH_WINDOW, PRICE_BATCH_MAX_IDS)
+
+async def get_token_prices(mints):
+    """
+    Price info for each of `mints` ({} when unknown). Served from the short-TTL price cache,
+    with all misses resolved through one batched request.
+    """
+    prices, missing = token_price_cache.get_many(dict.fromkeys(mints))
+    if missing:
+        try:
+            futures = {mint: price_batcher.submit(mint, key=mint) for mint in missing}
+            # Shielded: a keyed future is shared with concurrent lookups of the same mint,
+            # so cancelling this lookup must not cancel it for them
+            fetched = dict(zip(futures, await asyncio.gather(*map(asyncio.shield, futures.values()))))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Token price lookup failed for {missing}: {e}")
+            fetched = {}
+        else:
+            for mint, price_info in fetched.items():
+                token_price_cache.set(mint, price_info)
+        prices.update(fetched)
+    return {mint: prices.get(mint) or {} for mint in mints}
+
+async def get_token_price(mint):
+    prices = await get_token_prices([mint])
+    return prices[mint]
         
-async def enrich_trade_context(tx, target_wallet):
-    """Extract structured trade info from parsed transaction."""
+ENRICH_CONCURRENCY = 16  # max concurrent metadata lookups across all enrichments
+
+_enrich_semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+
+async def _bounded(coro):
+    async with _enrich_semaphore:
+        return await coro
 
+async def _timed(stage, coro):
+    with pipeline_metrics.timed(stage):
+        return await coro
+
+def index_token_balances(meta):
+    """
+    Indexes pre/post token balances by (accountIndex, owner, mint) and returns
+    the net uiAmount change per (owner, mint) for the whole transaction.
+    """
+    balances = {}
+    for side, key in ((0, "preTokenBalances"), (1, "postTokenBalances")):
+        for balance in meta.get(key) or []:
+            index_key = (balance.get("accountIndex"), balance.get("owner"), balance.get("mint"))
+            amounts = balances.setdefault(index_key, [0.0, 0.0])
+            amounts[side] = float((balance.get("uiTokenAmount") or {}).get("uiAmount") or 0)
+
+    deltas = {}
+    for (_, owner, mint), (pre_amt, post_amt) in balances.items():
+        deltas[(owner, mint)] = deltas.get((owner, mint), 0.0) + post_amt - pre_amt
+    return deltas
+
+def trade_direction(deltas, owner, mint):
+    delta = deltas.get((owner, mint), 0.0)
+    if delta > 0:
+        return "buy"
+    if delta < 0:
+        return "sell"
+    return "unknown"
+
+def _parsed_ui_amount(info, decimals_by_mint):
+    """
+    UI amount of a parsed token instruction. Checked instructions carry `tokenAmount`; plain
+    `mintTo` / `burn` only have the raw base-unit `amount`, scaled here by the mint's decimals.
+    """
+    token_amount = info.get("tokenAmount")
+    if token_amount:
+        ui_amount = token_amount.get("uiAmountString") or token_amount.get("uiAmount")
+        return float(ui_amount) if ui_amount is not None else None
+    decimals = info.get("decimals", decimals_by_mint.get(info["mint"]))
+    if info.get("amount") is None or decimals is None:
+        return None
+    return int(info["amount"]) / 10 ** decimals
+
+def parsed_token_instructions(tx):
+    """Token instructions of a `jsonParsed` transaction: [{"program", "type", "mint", "amount"}], amounts in UI units."""
     transaction = tx.get("transaction", {})
     message = transaction.get("message", {})
-    meta = transaction.get("meta", {})
-
-    instructions = message.get("instructions", [])
+    meta = tx.get("meta") or transaction.get("meta") or {}
+    decimals_by_mint = {
+        balance["mint"]: balance["uiTokenAmount"]["decimals"]
+        for balance in (meta.get("preTokenBalances") or []) + (meta.get("postTokenBalances") or [])
+    }
 
-    trades = []
-    for ix in instructions:
-        parsed = ix.get("parsed", {})
-        if not parsed:
+    instructions = []
+    for ix in message.get("instructions", []):
+        parsed = ix.get("parsed")
+        if not isinstance(parsed, dict):
             continue
-
         info = parsed.get("info", {})
-        mint = info.get("mint")
-        program = ix.get("program")
-        tx_type = parsed.get("type")
-
-        amount = (
-            info.get("tokenAmount", {}).get("uiAmount")
-            or info.get("amount")
-            or info.get("uiAmountString")
-        )
+        if info.get("mint"):
+            instructions.append({
+                "program": ix.get("program"),
+                "type": parsed.get("type"),
+                "mint": info["mint"],
+                "amount": _parsed_ui_amount(info, decimals_by_mint),
+            })
+    return instructions
 
-        if not mint:
-            continue
+async def enrich_trade_context(tx, target_wallet):
+    """
+    Extract structured trade info from a fetched transaction: either `jsonParsed` JSON (a dict)
+    or a base64-encoded solders transaction decoded locally, inner instructions included.
+    Metadata and price lookups for all mints run concurrently; balance deltas are computed once.
+    """
+    if isinstance(tx, dict):
+        meta = tx.get("meta") or tx.get("transaction", {}).get("meta") or {}
+        token_instructions = parsed_token_instructions(tx)
+    else:
+        meta = tx.transaction.meta
+        token_instructions = decode_token_instructions(tx)
+
+    if not token_instructions:
+        return []
+
+    # Fan out all lookups: one batched price request plus one (cached) metadata lookup per mint
+    mints = list(dict.fromkeys(ix["mint"] for ix in token_instructions))
+    prices, *token_metas = await asyncio.gather(
+        _timed("price", get_token_prices(mints)),
+        *(_timed("metadata", _bounded(get_token_metadata(mint))) for mint in mints),
+    )
+    metadata = dict(zip(mints, token_metas))
+    deltas = index_token_balances(meta) if isinstance(tx, dict) else token_balance_deltas(meta)
 
-        token_meta = await get_token_metadata(mint)
-        price_info = await get_token_price(token_meta.get("id"))
-
-        pre_balances = meta.get("preTokenBalances", [])
-        print("PRE: ", pre_balances)
-        post_balances = meta.get("postTokenBalances", [])
-        print("POST: ", post_balances)
-
-        direction = "unknown"
-        for pre, post in zip(pre_balances, post_balances):
-            owner = pre.get("owner")
-            if owner == target_wallet:
-                pre_amt = float(pre["uiTokenAmount"].get("uiAmount") or 0)
-                post_amt = float(post["uiTokenAmount"].get("uiAmount") or 0)
-                if post_amt > pre_amt:
-                    direction = "buy"
-                elif post_amt < pre_amt:
-                    direction = "sell"
-                break
+    trades = []
+    for ix in token_instructions:
+        mint = ix["mint"]
+        token_meta = metadata[mint]
+        price_info = prices.get(mint, {})
 
         trades.append({
-            "type": tx_type,
-            "program": program,
+            "type": ix["type"],
+            "program": ix["program"],
             "mint": mint,
             "token": token_meta.get("symbol"),
             "name": token_meta.get("name"),
-            "amount": amount,
+            "amount": ix["amount"],
             "price_usd": price_info.get("usdPrice"),
-            "direction": direction,
+            "direction": trade_direction(deltas, target_wallet, mint),
         })
 
     return trades
 
+# Each signature is fetched once and analyzed once per target wallet, across all watchers
+TRANSACTION_CACHE_TTL = 60
+SEEN_SIGNATURES_TTL = 60 * 60
+SEEN_SIGNATURES_SIZE = 50_000
+
+transaction_cache = TTLCache(ttl=TRANSACTION_CACHE_TTL, negative_ttl=0, max_size=1_000)
+# An analysis that couldn't fetch its transaction returns None, which isn't kept (negative_ttl=0),
+# so a retry or backfill replay of that signature is analyzed again
+seen_signatures = TTLCache(ttl=SEEN_SIGNATURES_TTL, negative_ttl=0, max_size=SEEN_SIGNATURES_SIZE)
+
+# "jsonParsed" has the node parse instructions; "base64" is smaller and faster to serve,
+# and is decoded locally (inner instructions included) by tx_decoder
+TX_ENCODING = os.getenv("TX_ENCODING", "jsonParsed")
+
+async def _fetch_parsed_transaction(signature):
+    client = await get_rpc_client()
+    resp = await client.get_transaction(signature, encoding=TX_ENCODING, max_supported_transaction_version=0)
+    return resp.value
+
 async def fetch_parsed_transaction(signature: str):
-    async with AsyncClient("https://api.devnet.solana.com") as client:
-        resp = await client.get_transaction(signature, encoding="jsonParsed")
-        return resp.value
+    """
+    Fetches a transaction (in TX_ENCODING) on the shared RPC client; concurrent fetches of one
+    signature share a request.
+    """
+    return await transaction_cache.get_or_fetch(str(signature), lambda: _fetch_parsed_transaction(signature))
 
-async def process_log_notification(msg, wallet_pubkey, ai_trigger_count):
+def get_dedup_stats():
+    """Counters for duplicate signatures suppressed before fetch / analysis."""
+    return {
+        "duplicate_analyses_suppressed": seen_signatures.hits + seen_signatures.coalesced,
+        "duplicate_fetches_suppressed": transaction_cache.hits + transaction_cache.coalesced,
+        "seen_signatures": len(seen_signatures),
+    }
+
+AI_TRIGGER_LIMIT = 5
+
+# Ingestion / processing pipeline settings
+WATCHER_QUEUE_SIZE = int(os.getenv("WATCHER_QUEUE_SIZE", 1000))
+WATCHER_WORKERS = int(os.getenv("WATCHER_WORKERS", 8))
+WATCHER_OVERFLOW = os.getenv("WATCHER_OVERFLOW", "block")  # block | drop-oldest | coalesce
+
+# Outcome counters for /metrics (filter and classifier drops are counted by rule there)
+trade_counts = {"seen": 0, "copied": 0, "passed": 0}
+
+log_classifier = LogClassifier()
+trade_filter = TradeFilter(
+    liquidity_lookup=lambda mint: (token_metadata_cache.peek(mint) or {}).get("liquidity"),
+)
+
+def is_trade_notification(msg):
+    """
+    Counts a log notification as seen and classifies it from its own logs. The hub runs it
+    once per notification before fanning out, so votes, compute-budget noise and plain SOL
+    transfers never take a queue slot, a worker turn or an RPC call.
+    """
     if not hasattr(msg, "result") or not hasattr(msg.result, "value"):
-        return ai_trigger_count
+        return False
+    trade_counts["seen"] += 1
+    return log_classifier.is_trade(log_classifier.classify(getattr(msg.result.value, "logs", None)))
 
+async def analyze_log_notification(msg, wallet_pubkey):
+    """
+    Fetch → enrich → analyze for one log notification that passed `is_trade_notification`.
+    Returns True when the AI agent was triggered for this transaction.
+    A (signature, wallet) pair is analyzed at most once; repeats and concurrent
+    duplicates share the first result. A transaction the node couldn't return yet
+    doesn't count, so its signature is analyzed again when it comes back.
+    """
+    if not hasattr(msg, "result") or not hasattr(msg.result, "value"):
+        return False
+
+    signature = getattr(msg.result.value, "signature", None)
+    if signature is None:
+        return await _analyze_log_notification(msg, wallet_pubkey)
+
+    return await seen_signatures.get_or_fetch(
+        (str(signature), wallet_pubkey),
+        lambda: _analyze_log_notification(msg, wallet_pubkey),
+    )
+
+async def _analyze_log_notification(msg, wallet_pubkey):
     value = msg.result.value
     signature = getattr(value, "signature", None)
     logs = getattr(value, "logs", [])
     err = getattr(value, "err", None)
 
     if err:
-        print(f"Transaction failed: {signature}")
-        return ai_trigger_count
+        log(f"Transaction failed: {signature}")
+        return False
     
-    print(f"\nNew Transaction Detected:")
-    print(f"Signature: {signature}")
+    log(f"\nNew Transaction Detected:")
+    log(f"Signature: {signature}")
 
-    tx = await fetch_parsed_transaction(signature)
+    with pipeline_metrics.timed("fetch"):
+        tx = await fetch_parsed_transaction(signature)
     if not tx:
-        return ai_trigger_count
+        # Not available on the node (yet): unfinished, so not marked seen
+        return None
     
-    tx_json = json.loads(tx.to_json()) if hasattr(tx, "to_json") else json.loads(tx.to_json_string())
-
-    trade_context = await enrich_trade_context(tx_json, wallet_pubkey)
-    print("Trade context:", trade_context)
-
-    print(f"Logs:")
-    for line in logs:
-        print(f"   {line}")
-
-    if any("Transfer" in line or "TransferChecked" in line for line in logs):
+    if TX_ENCODING == "base64":
+        tx_data = tx
+    else:
+        tx_data = json.loads(tx.to_json()) if hasattr(tx, "to_json") else json.loads(tx.to_json_string())
+    # Backfilled notifications carry no logs; classify them from the transaction itself
+    if not logs:
+        if TX_ENCODING == "base64":
+            logs = log_messages(tx)
+        else:
+            meta = tx_data.get("meta") or tx_data.get("transaction", {}).get("meta") or {}
+            logs = meta.get("logMessages") or []
+        if log_classifier.classify(logs) not in ("swap", "token_transfer"):
+            return False
+
+    with pipeline_metrics.timed("enrich"):
+        trade_context = await enrich_trade_context(tx_data, wallet_pubkey)
+    if VERBOSE_LOGS:
+        print("Trade context:", trade_context)
+        print(f"Logs:")
+        for line in logs:
+            print(f"   {line}")
         print("Detected Token Transfer")
 
-        # Send to AI agent for analysis
-        trade_data = {
-            "wallet": wallet_pubkey,
-            "logs": logs,
-            "trade_context": trade_context[0]
-        }
+    # Skip obvious PASS cases (dust, illiquid, denied, rate limited) without an LLM call
+    trade, rejected_by = trade_filter.select(wallet_pubkey, trade_context)
+    if trade is None:
+        log(f"Trade filtered by rule: {rejected_by}")
+        return False
+
+    # Send to AI agent for analysis
+    trade_data = {
+        "wallet": wallet_pubkey,
+        "logs": logs,
+        "trade_context": trade
+    }
 
-        print(trade_data)
+    log(trade_data)
 
+    with pipeline_metrics.timed("analyze"):
         ai_response = await sent_trade_to_agent(trade_data)
-        print("AI JUDGEMENT: ", ai_response)
-        if ai_response:
-            ai_trigger_count += 1
-            print(f"AI triggered {ai_trigger_count}/5 times")
+    decision = (ai_response or {}).get("response", {}).get("decision")
+    if decision == "COPY":
+        trade_counts["copied"] += 1
+    elif decision == "PASS":
+        trade_counts["passed"] += 1
+    log("AI JUDGEMENT: ", decision)
+    return decision is not None
 
+async def process_log_notification(msg, wallet_pubkey, ai_trigger_count):
+    if is_trade_notification(msg) and await analyze_log_notification(msg, wallet_pubkey):
+        ai_trigger_count += 1
+        print(f"AI triggered {ai_trigger_count}/{AI_TRIGGER_LIMIT} times")
     return ai_trigger_count
 
-async def watch_wallet_and_tokens(target_wallet: str):
-    """
-    Watches the given wallet using Solana WebSocket RPC.
-    When a new transaction is detected, the watcher sends it to our backend for AI analysis.
-    """
-    ai_trigger_count = 0
-
-    async with connect("wss://api.devnet.solana.com") as websocket:
-        # Subscribe to all logs mentioning target_wallet
-        # "mentions" filters logs that involve a specific address
-        await websocket.logs_subscribe(RpcTransactionLogsFilterMentions(Pubkey.from_string(target_wallet)))
-        print(f"Watching wallet {target_wallet} for trade activity...")
+def _notification_position(msg):
+    """(slot, signature) of a log notification, or None if it has no signature."""
+    result = getattr(msg, "result", None)
+    signature = getattr(getattr(result, "value", None), "signature", None)
+    if signature is None:
+        return None
+    return getattr(getattr(result, "context", None), "slot", 0), str(signature)
 
-        async for msg in websocket:
-
-            try:
-                if ai_trigger_count >= 5:
-                    print("✅ Reached AI trigger limit (5). Stopping watcher.")
-                    break
+class WalletWatch:
+    """
+    Progress of one watch job: the target wallet, how many times the AI was triggered for it
+    and its checkpoint. A resumed job starts from its persisted progress;
+    `on_trigger(watch)` runs after every trigger so the count can be saved right away.
 
-                if isinstance(msg, list):
-                    for single_msg in msg:
-                        ai_trigger_count = await process_log_notification(single_msg, target_wallet, ai_trigger_count)
-                else:
-                    ai_trigger_count = await process_log_notification(msg, target_wallet, ai_trigger_count)
+    Workers finish notifications out of order, so `last_signature` / `last_slot` is a
+    low-water mark: the newest handled notification with nothing older still queued or in
+    flight. A resumed job backfills from there and never skips an unhandled notification.
+    """
 
-            except ConnectionClosedError:
-                print("Connection lost — reconnecting in 5s...")
-                await asyncio.sleep(5)
+    def __init__(
+        self,
+        target_wallet: str,
+        trigger_limit: int = AI_TRIGGER_LIMIT,
+        ai_trigger_count: int = 0,
+        last_signature: str | None = None,
+        last_slot: int = 0,
+        on_trigger=None,
+    ):
+        self.target_wallet = target_wallet
+        self.trigger_limit = trigger_limit
+        self.ai_trigger_count = ai_trigger_count
+        self.last_signature = last_signature
+        self.last_slot = last_slot
+        self.on_trigger = on_trigger
+        self.done = asyncio.Event()
+        if ai_trigger_count >= trigger_limit:
+            self.done.set()
+        self._pending: set[tuple[int, str]] = set()     # queued or in flight
+        self._handled: list[tuple[int, str]] = []       # heap of handled, above the low-water mark
+
+    def queued(self, msg):
+        position = _notification_position(msg)
+        if position is not None:
+            self._pending.add(position)
+
+    def handled(self, msg):
+        """Marks `msg` settled and advances the checkpoint past everything older than the pending work."""
+        position = _notification_position(msg)
+        if position is None:
+            return
+        self._pending.discard(position)
+        heapq.heappush(self._handled, position)
+        floor = min((slot for slot, _ in self._pending), default=math.inf)
+        while self._handled and self._handled[0][0] < floor:
+            slot, signature = heapq.heappop(self._handled)
+            if slot >= self.last_slot:
+                self.last_signature, self.last_slot = signature, slot
+
+async def handle_trade_work(item):
+    """Worker entry point: runs one queued notification for its watch job."""
+    msg, watch = item
+    if watch.done.is_set():
+        watch.handled(msg)
+        return
+    try:
+        triggered = await analyze_log_notification(msg, watch.target_wallet)
+    finally:
+        # Cancelled (shutdown) work stays pending, so a resumed job replays it
+        if not asyncio.current_task().cancelling():
+            watch.handled(msg)
+
+    if triggered:
+        watch.ai_trigger_count += 1
+        log(f"AI triggered {watch.ai_trigger_count}/{watch.trigger_limit} times")
+        if watch.on_trigger is not None:
+            watch.on_trigger(watch)
+        if watch.ai_trigger_count >= watch.trigger_limit:
+            watch.done.set()
+
+def _trade_work_key(item):
+    msg, watch = item
+    value = getattr(getattr(msg, "result", None), "value", None)
+    return (str(getattr(value, "signature", None)), id(watch))
+
+_trade_queue: WorkQueue | None = None
+
+def get_trade_queue() -> WorkQueue:
+    """Returns the shared work queue whose workers process notifications from every watcher."""
+    global _trade_queue
+    if _trade_queue is None:
+        _trade_queue = WorkQueue(
+            handle_trade_work,
+            maxsize=WATCHER_QUEUE_SIZE,
+            workers=WATCHER_WORKERS,
+            overflow=WATCHER_OVERFLOW,
+            key=_trade_work_key,
+            metrics=pipeline_metrics,
+            on_drop=lambda item: item[1].handled(item[0]),
+        )
+    return _trade_queue
+
+async def close_trade_queue():
+    """Stops the queue workers. Called from the FastAPI lifespan on shutdown."""
+    global _trade_queue
+    if _trade_queue is not None:
+        await _trade_queue.stop()
+    _trade_queue = None
+
+async def watch_wallet_and_tokens(
+    target_wallet: str,
+    hub: WatcherHub | None = None,
+    trigger_limit: int = AI_TRIGGER_LIMIT,
+    watch: WalletWatch | None = None,
+):
+    """
+    Watches the given wallet through the shared WatcherHub subscription.
+    The hub's socket reader only enqueues notifications; the trade queue's workers
+    fetch, enrich and send them to our backend for AI analysis.
+    Pass a `watch` with saved progress to resume a job; transactions after its
+    `last_signature` are backfilled.
+    """
+    hub = hub or get_watcher_hub()
+    trade_queue = get_trade_queue()
+    watch = watch or WalletWatch(target_wallet, trigger_limit)
+    if watch.done.is_set():
+        return
+
+    # The hub classifies each notification once, however many users copy this wallet
+    def enqueue(msg):
+        watch.queued(msg)
+        return trade_queue.put((msg, watch))
+
+    token = await hub.subscribe(target_wallet, enqueue, accept=is_trade_notification)
+    print(f"Watching wallet {target_wallet} for trade activity...")
+    if watch.last_signature and hub.seed_cursor(target_wallet, watch.last_slot, watch.last_signature):
+        await hub.backfill(target_wallet)
 
-            # except Exception as e:
-            #     print(f"Watcher error: {e}")
-            #     await asyncio.sleep(5)
+    try:
+        await watch.done.wait()
+        print(f"✅ Reached AI trigger limit ({watch.trigger_limit}). Stopping watcher.")
+    finally:
+        await hub.unsubscribe(target_wallet, token)
 
 async def watch_wallet_and_sol_transfer(target_wallet: str, user_pubkey: str):
     """
@@ -211,48 +607,58 @@ async def watch_wallet_and_sol_transfer(target_wallet: str, user_pubkey: str):
     """
     print(f"Watching wallet {target_wallet} for trade activity...")
 
-    async with connect("wss://api.devnet.solana.com/") as websocket:
-
-        await websocket.account_subscribe(Pubkey.from_string(target_wallet))
-        print("Subscription established")
-
-        async for msg in websocket:
-            try:
-                if isinstance(msg, list):
-                    msg = msg[0]
-
-                if hasattr(msg, "result") and not hasattr(msg.result, "value"):
-                    print("Subscription confirmed.")
-                    continue
+    attempt = 0
+    while True:
+        try:
+            async with connect(WS_URL) as websocket:
+                await websocket.account_subscribe(Pubkey.from_string(target_wallet))
+                print("Subscription established")
+                attempt = 0
+
+                async for msg in websocket:
+                    try:
+                        await _handle_account_notification(msg, target_wallet)
+                    except Exception as e:
+                        print(f"Watcher error: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Connection lost: {e}")
+
+        # Reconnect (and resubscribe) on a fresh socket
+        delay = backoff_delay(attempt)
+        attempt += 1
+        print(f"Reconnecting in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+
+async def _handle_account_notification(msg, target_wallet: str):
+    if isinstance(msg, list):
+        msg = msg[0]
+
+    if hasattr(msg, "result") and not hasattr(msg.result, "value"):
+        print("Subscription confirmed.")
+        return
+
+    if hasattr(msg, "result") and hasattr(msg.result, "value"):
+        data = msg.result.value.data
+        lamports = msg.result.value.lamports
+        print(f"Account change detected for {target_wallet}")
+        print(f"Raw Data: {data}")
+        print(f"Lamports: {lamports}")
 
-                if hasattr(msg, "result") and hasattr(msg.result, "value"):
-                    data = msg.result.value.data
-                    lamports = msg.result.value.lamports
-                    print(f"Account change detected for {target_wallet}")
-                    print(f"Raw Data: {data}")
-                    print(f"Lamports: {lamports}")
-
-                    trade_data = {
-                        "wallet": target_wallet,
-                        "raw_data": str(data)
-                    }
-
-                    response = await sent_trade_to_agent(trade_data, user_pubkey)
-                    print(f"AI Agent Response: {response}")
-
-                    decision = response.get("response")
-                    if decision.lower() == "copy":
-                        print(f"Triggering trade execution: {decision}")
-                else:
-                    print(f"Ignored message type: {msg}")
+        trade_data = {
+            "wallet": target_wallet,
+            "raw_data": str(data)
+        }
 
-            except ConnectionClosedError:
-                print("Connection lost — reconnecting in 5s...")
-                await asyncio.sleep(5)
+        response = await sent_trade_to_agent(trade_data)
+        print(f"AI Agent Response: {response}")
 
-            except Exception as e:
-                print(f"Watcher error: {e}")
-                await asyncio.sleep(5)
+        decision = (response or {}).get("response", {}).get("decision", "")
+        if decision.lower() == "copy":
+            print(f"Triggering trade execution: {decision}")
+    else:
+        print(f"Ignored message type: {msg}")
 
 if __name__ == "__main__":
     # asyncio.run(watch_wallet(